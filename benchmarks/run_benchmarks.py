@@ -0,0 +1,430 @@
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+import telegram
+import fetch_nasa_apod_images
+import fetch_nasa_epic_images
+import fetch_spacex_images
+from benchmarks.startup import bench_startup
+from benchmarks.stub_server import DEFAULT_IMAGE_SIZE, StubServer
+from cosmo_snaps_bot import publish_image
+from image_catalog import ImageCatalog
+from image_selector import ImageSelector, PostHistory
+from image_utils import DEFAULT_WORKERS, DownloadEngine, DownloadJob
+from telegram_cache import TelegramUploadCache
+from utils import logger, setup_logging
+
+
+DEFAULT_DOWNLOAD_IMAGES = 200  # Сколько изображений скачивать в тесте пропускной способности
+DEFAULT_CATALOG_SIZE = 30000  # Размер синтетического каталога для теста публикации
+DEFAULT_PUBLISH_COUNT = 200  # Сколько публикаций выполнять в тесте публикации
+RESULTS_PATH = "benchmark_results.json"  # Файл с результатами по умолчанию
+
+
+def peak_rss_kb() -> int:
+    """Возвращает пиковое потребление памяти процессом (RSS) в килобайтах.
+
+    Returns:
+        int: Пиковый RSS с начала работы процесса.
+    """
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage // 1024 if sys.platform == "darwin" else usage
+
+
+def summarize(samples: list) -> dict:
+    """Считает статистику по замерам длительности.
+
+    Args:
+        samples (list): Длительности в секундах.
+
+    Returns:
+        dict: min, mean, p50, p95 и max в миллисекундах.
+    """
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "min_ms": ordered[0] * 1000,
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": ordered[len(ordered) // 2] * 1000,
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def run_isolated(func):
+    """Выполняет функцию в дочернем процессе (fork) и возвращает её результат.
+
+    Пиковый RSS процесса (ru_maxrss) только растёт, поэтому в общем процессе
+    каждый следующий замер повторял бы максимум предыдущих. У дочернего
+    процесса пик отсчитывается заново, от памяти, занятой в момент fork.
+    Файлы, созданные функцией, остаются на диске, а изменения объектов
+    в памяти родительскому процессу не видны.
+
+    Args:
+        func (Callable): Функция без аргументов, результат которой можно передать через pickle.
+
+    Returns:
+        Результат функции.
+
+    Raises:
+        RuntimeError: Если функция завершилась с ошибкой или дочерний процесс аварийно завершился.
+    """
+    context = multiprocessing.get_context("fork")
+    receiver, sender = context.Pipe(duplex=False)
+
+    def target() -> None:
+        try:
+            sender.send((True, func()))
+        except BaseException as e:
+            sender.send((False, f"{type(e).__name__}: {e}"))
+
+    process = context.Process(target=target)
+    process.start()
+    sender.close()
+    try:
+        succeeded, result = receiver.recv()
+    except EOFError:
+        process.join()
+        raise RuntimeError(f"Дочерний процесс теста завершился с кодом {process.exitcode}")
+    process.join()
+    if not succeeded:
+        raise RuntimeError(result)
+    return result
+
+
+def measure(func, trace_memory: bool = False) -> dict:
+    """Выполняет функцию в отдельном процессе и замеряет время и память.
+
+    Args:
+        func (Callable): Функция без аргументов.
+        trace_memory (bool, optional): Замерить пик памяти Python через tracemalloc
+            (замедляет выполнение, поэтому по умолчанию выключено).
+
+    Returns:
+        dict: seconds, peak_rss_kb (пик RSS процесса с этим замером),
+            rss_growth_kb (рост пика за время замера) и, с trace_memory, traced_peak_kb.
+    """
+    def run() -> dict:
+        rss_before = peak_rss_kb()
+        if trace_memory:
+            tracemalloc.start()
+        started = time.perf_counter()
+        try:
+            func()
+            result = {"seconds": time.perf_counter() - started}
+        finally:
+            if trace_memory:
+                result_peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+        if trace_memory:
+            result["traced_peak_kb"] = result_peak // 1024
+        result["peak_rss_kb"] = peak_rss_kb()
+        result["rss_growth_kb"] = result["peak_rss_kb"] - rss_before
+        return result
+
+    return run_isolated(run)
+
+
+def bench_download(stub: StubServer, workdir: str, images: int, workers: int, repeat: int,
+                   trace_memory: bool) -> dict:
+    """Замеряет пропускную способность download_image через DownloadEngine.
+
+    Args:
+        stub (StubServer): Запущенная заглушка.
+        workdir (str): Временная папка.
+        images (int): Количество изображений.
+        workers (int): Количество потоков загрузки.
+        repeat (int): Количество повторов.
+        trace_memory (bool): Замерить пик памяти Python.
+
+    Returns:
+        dict: Результаты лучшего повтора и длительности всех повторов.
+    """
+    runs = []
+    for attempt in range(repeat):
+        save_dir = os.path.join(workdir, f"download_{attempt}")
+        jobs = [
+            DownloadJob(f"{stub.url}/images/bench/{number}.jpg", save_dir, number, prefix="bench")
+            for number in range(images)
+        ]
+
+        def run() -> None:
+            with DownloadEngine(workers=workers, dedup="off") as engine:
+                results = engine.download_all(jobs)
+            if None in results:
+                raise RuntimeError(f"Не скачано изображений: {results.count(None)}")
+
+        runs.append(measure(run, trace_memory))
+    best = min(runs, key=lambda run: run["seconds"])
+    total_bytes = images * stub.image_size
+    return {
+        "images": images,
+        "workers": workers,
+        "bytes": total_bytes,
+        "seconds": best["seconds"],
+        "all_seconds": [run["seconds"] for run in runs],
+        "images_per_second": images / best["seconds"],
+        "megabytes_per_second": total_bytes / best["seconds"] / (1024 * 1024),
+        **{key: value for key, value in best.items() if key != "seconds"},
+    }
+
+
+def bench_fetchers(stub: StubServer, workdir: str, workers: int, repeat: int, trace_memory: bool) -> dict:
+    """Замеряет полное время работы скриптов загрузки.
+
+    Проверка дубликатов отключена: иначе повторы находили бы изображения,
+    скачанные предыдущим повтором, и ничего не скачивали.
+
+    Args:
+        stub (StubServer): Запущенная заглушка, на которую направлены скрипты загрузки.
+        workdir (str): Временная папка.
+        workers (int): Количество потоков загрузки.
+        repeat (int): Количество повторов.
+        trace_memory (bool): Замерить пик памяти Python.
+
+    Returns:
+        dict: Результаты по каждому скрипту.
+    """
+    today = date.today()
+    scenarios = {
+        "apod_main": lambda save_dir: fetch_nasa_apod_images.main(
+            api_key="DEMO_KEY", save_dir=save_dir, count=100, workers=workers, dedup="off"),
+        "apod_backfill": lambda save_dir: fetch_nasa_apod_images.backfill(
+            api_key="DEMO_KEY", start_date=date(2020, 1, 1), end_date=date(2020, 6, 30), save_dir=save_dir,
+            workers=workers, dedup="off"),
+        "epic_main": lambda save_dir: fetch_nasa_epic_images.main(
+            count=10, save_dir=save_dir, api_key="DEMO_KEY", workers=workers, dedup="off"),
+        "epic_archive": lambda save_dir: fetch_nasa_epic_images.fetch_archive(
+            api_key="DEMO_KEY", start_date=today - timedelta(days=9), end_date=today, save_dir=save_dir,
+            workers=workers, dedup="off"),
+        "spacex_main": lambda save_dir: fetch_spacex_images.main(
+            save_dir=save_dir, workers=workers, dedup="off"),
+        "spacex_harvest": lambda save_dir: fetch_spacex_images.harvest(
+            save_dir=save_dir, workers=workers, dedup="off"),
+    }
+    results = {}
+    for name, scenario in scenarios.items():
+        runs = []
+        for attempt in range(repeat):
+            save_dir = os.path.join(workdir, f"{name}_{attempt}")
+            requests_before = stub.requests
+            run = measure(lambda: scenario(save_dir), trace_memory)
+            run["requests"] = stub.requests - requests_before
+            run["files"] = sum(1 for filename in os.listdir(save_dir) if not filename.startswith("."))
+            runs.append(run)
+        best = min(runs, key=lambda run: run["seconds"])
+        results[name] = {**best, "all_seconds": [run["seconds"] for run in runs]}
+    return results
+
+
+def build_catalog(workdir: str, catalog_size: int, image_size: int) -> dict:
+    """Создаёт синтетический каталог изображений трёх источников.
+
+    Args:
+        workdir (str): Временная папка.
+        catalog_size (int): Общее количество изображений.
+        image_size (int): Размер одного изображения в байтах.
+
+    Returns:
+        dict: Словарь {источник: папка}.
+    """
+    sources = {
+        "NASA APOD": os.path.join(workdir, "catalog", "nasa_images"),
+        "NASA EPIC": os.path.join(workdir, "catalog", "nasa_epic_photos"),
+        "SpaceX": os.path.join(workdir, "catalog", "spacex_images"),
+    }
+    payload = os.urandom(image_size)
+    for number in range(catalog_size):
+        source_dir = list(sources.values())[number % len(sources)]
+        os.makedirs(source_dir, exist_ok=True)
+        with open(os.path.join(source_dir, f"image_{number:06d}.jpg"), "wb") as f:
+            f.write(payload)
+    return sources
+
+
+def bench_publish(stub: StubServer, workdir: str, catalog_size: int, publish_count: int,
+                  image_size: int) -> dict:
+    """Замеряет задержку publish_image на большом синтетическом каталоге.
+
+    Публикации отправляются в заглушку Telegram Bot API: сначала без кэша
+    загрузок (каждое изображение загружается), затем с TelegramUploadCache,
+    в котором заранее сохранены file_id всех изображений одного источника
+    (изображения отправляются по file_id).
+
+    Args:
+        stub (StubServer): Запущенная заглушка.
+        workdir (str): Временная папка.
+        catalog_size (int): Количество изображений в каталоге.
+        publish_count (int): Количество публикаций в каждом режиме.
+        image_size (int): Размер изображения в каталоге в байтах.
+
+    Returns:
+        dict: Время сканирования каталога и статистика задержек публикации.
+    """
+    sources = build_catalog(workdir, catalog_size, image_size)
+    rss_before = peak_rss_kb()
+    started = time.perf_counter()
+    catalog = ImageCatalog(sources)
+    scan_seconds = time.perf_counter() - started
+    bot = telegram.Bot(token="123456:BENCHMARK", base_url=stub.telegram_base_url)
+    results = {
+        "catalog_size": catalog.count(),
+        "catalog_scan_seconds": scan_seconds,
+    }
+
+    file_ids_path = os.path.join(workdir, "file_ids.json")
+    with open(file_ids_path, "w", encoding="utf-8") as f:
+        json.dump({TelegramUploadCache.key(path): f"warm-{number}"
+                   for number, path in enumerate(catalog.paths("NASA APOD"))}, f)
+    modes = {
+        "upload": (None, None),
+        "file_id": (TelegramUploadCache(cache_dir=os.path.join(workdir, "derivatives"), file_ids_path=file_ids_path),
+                    {"NASA APOD": 1, "NASA EPIC": 0, "SpaceX": 0}),
+    }
+    for mode, (upload_cache, weights) in modes.items():
+        history = PostHistory(os.path.join(workdir, f"history_{mode}.json"))
+        selector = ImageSelector(catalog, weights=weights, history=history)
+        samples = []
+        for _ in range(publish_count):
+            started = time.perf_counter()
+            publish_image(bot, selector, chat_id="@benchmark", upload_cache=upload_cache)
+            samples.append(time.perf_counter() - started)
+        results[f"publish_{mode}"] = summarize(samples)
+    results["peak_rss_kb"] = peak_rss_kb()
+    results["rss_growth_kb"] = results["peak_rss_kb"] - rss_before
+    return results
+
+
+def git_commit() -> str | None:
+    """Возвращает хэш текущего коммита, если код находится в git-репозитории.
+
+    Returns:
+        str | None: Хэш коммита или None.
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(benchmarks: tuple = ("download", "fetchers", "publish", "startup"), image_size: int = DEFAULT_IMAGE_SIZE,
+         latency: float = 0.0, telegram_latency: float = 0.0, images: int = DEFAULT_DOWNLOAD_IMAGES,
+         workers: int = DEFAULT_WORKERS, catalog_size: int = DEFAULT_CATALOG_SIZE,
+         publish_count: int = DEFAULT_PUBLISH_COUNT, repeat: int = 3, trace_memory: bool = False,
+         seed: int = 0) -> dict:
+    """Запускает тесты производительности без доступа к сети.
+
+    Все запросы к NASA, SpaceX и Telegram направляются в локальную
+    заглушку, а файлы создаются во временной папке, которая удаляется
+    после завершения.
+
+    Args:
+        benchmarks (tuple, optional): Какие тесты запускать: 'download', 'fetchers', 'publish', 'startup'.
+        image_size (int, optional): Размер изображений заглушки в байтах.
+        latency (float, optional): Задержка ответов API и изображений в секундах.
+        telegram_latency (float, optional): Задержка ответов Telegram Bot API в секундах.
+        images (int, optional): Количество изображений в тесте загрузки.
+        workers (int, optional): Количество потоков загрузки.
+        catalog_size (int, optional): Размер каталога в тесте публикации.
+        publish_count (int, optional): Количество публикаций в тесте публикации.
+        repeat (int, optional): Количество повторов тестов загрузки.
+        trace_memory (bool, optional): Замерить пик памяти Python через tracemalloc.
+        seed (int, optional): Начальное значение генератора случайных чисел.
+
+    Returns:
+        dict: Результаты тестов и параметры запуска.
+    """
+    random.seed(seed)
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": {
+            "image_size": image_size, "latency": latency, "telegram_latency": telegram_latency,
+            "images": images, "workers": workers, "catalog_size": catalog_size,
+            "publish_count": publish_count, "repeat": repeat, "seed": seed,
+        },
+        "results": {},
+    }
+    previous_cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="cosmo_bench_") as workdir, \
+            StubServer(image_size=image_size, latency=latency, telegram_latency=telegram_latency) as stub:
+        os.chdir(workdir)  # индекс дубликатов и кэши создаются в текущей папке
+        try:
+            stub.patch_fetchers()
+            if "download" in benchmarks:
+                logger.warning("Тест загрузки изображений")
+                report["results"]["download"] = bench_download(stub, workdir, images, workers, repeat,
+                                                               trace_memory)
+            if "fetchers" in benchmarks:
+                logger.warning("Тест скриптов загрузки")
+                report["results"]["fetchers"] = bench_fetchers(stub, workdir, workers, repeat, trace_memory)
+            if "publish" in benchmarks:
+                logger.warning("Тест публикации")
+                report["results"]["publish"] = run_isolated(
+                    lambda: bench_publish(stub, workdir, catalog_size, publish_count, min(image_size, 16 * 1024))
+                )
+            if "startup" in benchmarks:
+                logger.warning("Тест времени запуска скриптов")
+                report["results"]["startup"] = bench_startup()
+        finally:
+            os.chdir(previous_cwd)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Тесты производительности с локальной заглушкой API")
+    parser.add_argument(
+        "--benchmarks",
+        nargs="+",
+        choices=("download", "fetchers", "publish", "startup"),
+        default=["download", "fetchers", "publish", "startup"],
+        help="Какие тесты запускать (по умолчанию все)"
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=RESULTS_PATH,
+        help=f"JSON-файл для результатов, '-' — вывести в консоль (по умолчанию {RESULTS_PATH})"
+    )
+    parser.add_argument("--image_size", type=int, default=DEFAULT_IMAGE_SIZE, help="Размер изображений (байт)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Задержка ответов API и изображений (секунды)")
+    parser.add_argument("--telegram_latency", type=float, default=0.0, help="Задержка ответов Telegram (секунды)")
+    parser.add_argument("--images", type=int, default=DEFAULT_DOWNLOAD_IMAGES, help="Изображений в тесте загрузки")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Потоков загрузки")
+    parser.add_argument("--catalog_size", type=int, default=DEFAULT_CATALOG_SIZE, help="Размер каталога")
+    parser.add_argument("--publish_count", type=int, default=DEFAULT_PUBLISH_COUNT, help="Количество публикаций")
+    parser.add_argument("--repeat", type=int, default=3, help="Повторов тестов загрузки (берётся лучший)")
+    parser.add_argument("--trace_memory", action="store_true", help="Замерить пик памяти Python (tracemalloc)")
+    parser.add_argument("--seed", type=int, default=0, help="Начальное значение генератора случайных чисел")
+    parser.add_argument("--verbose", action="store_true", help="Не скрывать INFO-сообщения")
+    args = parser.parse_args()
+
+    setup_logging(logging.INFO if args.verbose else logging.WARNING)
+    report = main(benchmarks=tuple(args.benchmarks), image_size=args.image_size, latency=args.latency,
+                  telegram_latency=args.telegram_latency, images=args.images, workers=args.workers,
+                  catalog_size=args.catalog_size, publish_count=args.publish_count, repeat=args.repeat,
+                  trace_memory=args.trace_memory, seed=args.seed)
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output == "-":
+        print(output)
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+        logger.warning(f"Результаты сохранены в {args.output}")
@@ -0,0 +1,152 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # Корень проекта
+ENTRY_POINTS = (
+    "cosmo_snaps_bot",
+    "fetch_service",
+    "fetch_nasa_apod_images",
+    "fetch_nasa_epic_images",
+    "fetch_spacex_images",
+    "dedup",
+    "image_validation",
+)  # Скрипты, время запуска которых замеряется
+HEAVY_MODULES = (
+    "requests", "telegram", "dotenv", "PIL.Image", "asyncio", "schedule", "http.server", "multiprocessing",
+)  # Зависимости, которые не должны загружаться при импорте скриптов
+STARTUP_REPEAT = 5  # Сколько раз запускать каждый замер (берётся медиана)
+TOP_IMPORTS = 10  # Сколько самых медленных модулей показывать для каждого скрипта
+
+
+def parse_importtime(output: str) -> dict:
+    """Разбирает вывод python -X importtime.
+
+    Args:
+        output (str): Содержимое stderr интерпретатора.
+
+    Returns:
+        dict: {модуль: (собственное время, время с вложенными импортами)} в микросекундах.
+    """
+    timings = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        if not self_us.strip().isdigit():
+            continue  # строка заголовка
+        timings.setdefault(name.strip(), (int(self_us), int(cumulative_us)))
+    return timings
+
+
+def measure_import(module: str) -> dict:
+    """Замеряет импорт модуля в новом процессе интерпретатора.
+
+    Args:
+        module (str): Имя модуля.
+
+    Returns:
+        dict: Время импорта модуля, загруженные тяжёлые зависимости и самые медленные модули.
+
+    Raises:
+        RuntimeError: Если модуль не импортируется.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=PROJECT_DIR,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Не удалось импортировать {module}: {result.stderr.strip().splitlines()[-1:]}")
+    timings = parse_importtime(result.stderr)
+    slowest = sorted(
+        ((name, self_us) for name, (self_us, _) in timings.items() if name != module),
+        key=lambda item: item[1], reverse=True,
+    )
+    return {
+        "import_ms": timings[module][1] / 1000,
+        "modules": len(timings),
+        "heavy_modules": [name for name in HEAVY_MODULES if name in timings],
+        "slowest": [{"module": name, "self_ms": self_us / 1000} for name, self_us in slowest[:TOP_IMPORTS]],
+    }
+
+
+def measure_help(module: str) -> float:
+    """Замеряет полное время запуска скрипта с --help, включая старт интерпретатора.
+
+    Args:
+        module (str): Имя модуля скрипта.
+
+    Returns:
+        float: Длительность в секундах.
+
+    Raises:
+        RuntimeError: Если скрипт завершился с ошибкой.
+    """
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, f"{module}.py", "--help"], capture_output=True, text=True, cwd=PROJECT_DIR,
+    )
+    seconds = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(f"{module}.py --help завершился с ошибкой: {result.stderr.strip().splitlines()[-1:]}")
+    return seconds
+
+
+def bench_startup(entry_points: tuple = ENTRY_POINTS, repeat: int = STARTUP_REPEAT) -> dict:
+    """Замеряет время холодного запуска скриптов.
+
+    Каждый замер выполняется в новом процессе, поэтому модули не
+    кэшируются между запусками (кэш байт-кода .pyc используется, как
+    при обычном запуске).
+
+    Args:
+        entry_points (tuple, optional): Имена модулей скриптов.
+        repeat (int, optional): Количество повторов каждого замера.
+
+    Returns:
+        dict: Для каждого скрипта — медианы времени импорта и запуска с --help,
+            тяжёлые зависимости и самые медленные модули последнего замера.
+    """
+    results = {}
+    for module in entry_points:
+        imports = [measure_import(module) for _ in range(repeat)]
+        help_seconds = [measure_help(module) for _ in range(repeat)]
+        results[module] = {
+            "import_ms": statistics.median(run["import_ms"] for run in imports),
+            "min_import_ms": min(run["import_ms"] for run in imports),
+            "help_ms": statistics.median(help_seconds) * 1000,
+            "modules": imports[-1]["modules"],
+            "heavy_modules": imports[-1]["heavy_modules"],
+            "slowest": imports[-1]["slowest"],
+        }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Замер времени запуска скриптов (python -X importtime)")
+    parser.add_argument(
+        "entry_points",
+        nargs="*",
+        default=list(ENTRY_POINTS),
+        help="Скрипты для замера (по умолчанию все)"
+    )
+    parser.add_argument("--repeat", type=int, default=STARTUP_REPEAT, help="Повторов каждого замера")
+    parser.add_argument(
+        "--max_import_ms",
+        type=float,
+        help="Завершиться с ошибкой, если импорт какого-либо скрипта дольше заданного времени (мс)"
+    )
+    args = parser.parse_args()
+
+    report = bench_startup(tuple(args.entry_points), args.repeat)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.max_import_ms is not None:
+        slow = [module for module, result in report.items() if result["import_ms"] > args.max_import_ms]
+        if slow:
+            print(f"Импорт дольше {args.max_import_ms} мс: {', '.join(slow)}", file=sys.stderr)
+            sys.exit(1)
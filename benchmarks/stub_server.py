@@ -0,0 +1,262 @@
+import hashlib
+import itertools
+import json
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import fetch_nasa_apod_images
+import fetch_nasa_epic_images
+import fetch_spacex_images
+
+
+DEFAULT_IMAGE_SIZE = 256 * 1024  # Размер синтетического изображения (байт)
+EPIC_IMAGES_PER_DAY = 12  # Сколько снимков EPIC отдаёт заглушка за один день
+SPACEX_LAUNCHES = 50  # Сколько запусков с фотографиями отдаёт заглушка SpaceX
+SPACEX_IMAGES_PER_LAUNCH = 4  # Фотографий у одного запуска SpaceX
+
+_TINY_JPEG = bytes.fromhex(
+    "ffd8ffe000104a46494600010100000100010000ffdb004300100b0c0e0c0a100e0d0e1211101318281a181616183123"
+    "251d283a333d3c3933383740485c4e404457453738506d51575f626768673e4d71797064785c656763ffc0000b080001"
+    "000101011100ffc4001f0000010501010101010100000000000000000102030405060708090a0bffc400b51000020103"
+    "03020403050504040000017d01020300041105122131410613516107227114328191a1082342b1c11552d1f024336272"
+    "82090a161718191a25262728292a3435363738393a434445464748494a535455565758595a636465666768696a737475"
+    "767778797a838485868788898a92939495969798999aa2a3a4a5a6a7a8a9aab2b3b4b5b6b7b8b9bac2c3c4c5c6c7c8c9"
+    "cad2d3d4d5d6d7d8d9dae1e2e3e4e5e6e7e8e9eaf1f2f3f4f5f6f7f8f9faffda0008010100003f00f40affd9"
+)  # Корректный JPEG 1x1, в который добавляются данные до нужного размера
+
+
+class StubServer:
+    """Локальная заглушка NASA APOD/EPIC, SpaceX API и Telegram Bot API.
+
+    Отдаёт синтетический JSON в формате настоящих API и изображения
+    заданного размера. Содержимое каждого изображения определяется его
+    URL, поэтому повторные запуски скачивают одни и те же байты, а разные
+    изображения не считаются дубликатами. Заголовки ETag и Range
+    поддерживаются так же, как у настоящих серверов.
+
+    Args:
+        image_size (int, optional): Размер изображения в байтах.
+        latency (float, optional): Задержка перед каждым ответом API и изображений (секунды).
+        telegram_latency (float, optional): Задержка ответа Telegram Bot API (секунды).
+        host (str, optional): Адрес сервера.
+        port (int, optional): Порт. 0 — выбрать свободный.
+    """
+
+    def __init__(self, image_size: int = DEFAULT_IMAGE_SIZE, latency: float = 0.0,
+                 telegram_latency: float = 0.0, host: str = "127.0.0.1", port: int = 0):
+        self.image_size = image_size
+        self.latency = latency
+        self.telegram_latency = telegram_latency
+        self.requests = 0
+        self.bytes_sent = 0
+        self._file_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _make_handler(self))
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        """Базовый URL сервера, например 'http://127.0.0.1:8123'."""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def telegram_base_url(self) -> str:
+        """Значение base_url для telegram.Bot."""
+        return f"{self.url}/bot"
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self) -> "StubServer":
+        """Запускает сервер в фоновом потоке.
+
+        Returns:
+            StubServer: Этот же сервер.
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stub-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Останавливает сервер."""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def patch_fetchers(self) -> None:
+        """Направляет скрипты загрузки на заглушку вместо настоящих API.
+
+        Заменяет константы с адресами API в модулях загрузки.
+        """
+        fetch_nasa_apod_images.APOD_API_URL = f"{self.url}/planetary/apod"
+        fetch_nasa_epic_images.EPIC_API_URL = f"{self.url}/EPIC/api"
+        fetch_nasa_epic_images.EPIC_ARCHIVE_URL = f"{self.url}/EPIC/archive"
+        fetch_spacex_images.SPACEX_API_URL = f"{self.url}/v4"
+
+    def image_bytes(self, path: str) -> bytes:
+        """Возвращает содержимое синтетического изображения.
+
+        Это корректный JPEG, который проходит проверку image_validation:
+        до нужного размера он дополняется сегментами APP15, которые
+        при проверке не удаляются.
+
+        Args:
+            path (str): Путь изображения в URL.
+
+        Returns:
+            bytes: Не меньше image_size байт, уникальных для path.
+        """
+        seed = hashlib.sha256(path.encode("utf-8")).digest()
+        padding = max(0, self.image_size - len(_TINY_JPEG))
+        segments = []
+        while padding > 4:
+            payload_size = min(padding - 4, 65533)
+            payload = (seed * (payload_size // len(seed) + 1))[:payload_size]
+            segments.append(b"\xff\xef" + (payload_size + 2).to_bytes(2, "big") + payload)
+            padding -= payload_size + 4
+        return _TINY_JPEG[:2] + b"".join(segments) + _TINY_JPEG[2:]
+
+    def _count(self, sent: int) -> None:
+        with self._lock:
+            self.requests += 1
+            self.bytes_sent += sent
+
+    def _apod_records(self, query: dict) -> list:
+        if "start_date" in query:
+            start = date.fromisoformat(query["start_date"][0])
+            end = date.fromisoformat(query.get("end_date", [date.today().isoformat()])[0])
+            days = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+        else:
+            count = int(query.get("count", ["1"])[0])
+            days = [date(2000, 1, 1) + timedelta(days=offset) for offset in range(count)]
+        return [
+            {"date": day.isoformat(), "media_type": "image", "title": f"APOD {day.isoformat()}",
+             "url": f"{self.url}/images/apod/{day.isoformat()}.jpg"}
+            for day in days
+        ]
+
+    def _epic_records(self, day: str) -> list:
+        return [
+            {"image": f"epic_1b_{day.replace('-', '')}{number:06d}", "date": f"{day} 00:{number:02d}:00"}
+            for number in range(EPIC_IMAGES_PER_DAY)
+        ]
+
+    def _spacex_launch(self, number: int) -> dict:
+        return {
+            "id": f"launch{number:04d}",
+            "name": f"Launch {number}",
+            "date_utc": (date(2022, 1, 1) - timedelta(days=number)).isoformat(),
+            "links": {
+                "flickr": {"original": [
+                    f"{self.url}/images/spacex/{number:04d}_{image}.jpg" for image in range(SPACEX_IMAGES_PER_LAUNCH)
+                ]},
+                "patch": {},
+            },
+        }
+
+    def _telegram_message(self, method: str) -> dict:
+        file_id = f"stub-file-{next(self._file_ids)}"
+        message = {"message_id": 1, "date": int(time.time()), "chat": {"id": -100, "type": "channel"}}
+        if method == "sendPhoto":
+            message["photo"] = [{"file_id": file_id, "file_unique_id": file_id, "width": 1, "height": 1}]
+        return message
+
+
+def _make_handler(stub: StubServer):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args) -> None:
+            pass
+
+        def _send(self, status: int, body: bytes, content_type: str = "application/json",
+                  headers: dict = None) -> None:
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+            stub._count(len(body))
+
+        def _send_json(self, data) -> None:
+            self._send(200, json.dumps(data).encode("utf-8"))
+
+        def _send_image(self, path: str) -> None:
+            body = stub.image_bytes(path)
+            etag = f'"{hashlib.sha1(path.encode("utf-8")).hexdigest()}"'
+            if self.headers.get("If-None-Match") == etag:
+                self._send(304, b"", headers={"ETag": etag})
+                return
+            range_header = self.headers.get("Range", "")
+            if range_header.startswith("bytes="):
+                offset = int(range_header[len("bytes="):].rstrip("-"))
+                if offset >= len(body):
+                    self._send(416, b"", headers={"Content-Range": f"bytes */{len(body)}"})
+                    return
+                self._send(206, body[offset:], "image/jpeg",
+                           {"ETag": etag, "Content-Range": f"bytes {offset}-{len(body) - 1}/{len(body)}"})
+                return
+            self._send(200, body, "image/jpeg", {"ETag": etag})
+
+        def do_GET(self) -> None:
+            parsed = urlparse(self.path)
+            path, query = parsed.path, parse_qs(parsed.query)
+            parts = path.strip("/").split("/")
+            if stub.latency:
+                time.sleep(stub.latency)
+            if path.startswith("/images/") or path.startswith("/EPIC/archive/"):
+                self._send_image(path)
+            elif path == "/planetary/apod":
+                self._send_json(stub._apod_records(query))
+            elif path.startswith("/EPIC/api/") and parts[-1] == "images":
+                self._send_json(stub._epic_records(date.today().isoformat()))
+            elif path.startswith("/EPIC/api/") and parts[-1] == "available":
+                self._send_json([(date.today() - timedelta(days=offset)).isoformat() for offset in range(30)])
+            elif path.startswith("/EPIC/api/") and parts[-2] == "date":
+                self._send_json(stub._epic_records(parts[-1]))
+            elif path == "/v4/launches/latest":
+                self._send_json(stub._spacex_launch(0))
+            elif path.startswith("/v4/launches/"):
+                self._send_json(stub._spacex_launch(int(parts[-1].removeprefix("launch") or 0)))
+            elif path.startswith("/bot"):
+                self._telegram(parts[-1])
+            else:
+                self._send(404, b"{}")
+
+        def do_POST(self) -> None:
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            path = urlparse(self.path).path
+            if path == "/v4/launches/query":
+                if stub.latency:
+                    time.sleep(stub.latency)
+                options = json.loads(body or b"{}").get("options", {})
+                page, limit = options.get("page", 1), options.get("limit", 10)
+                numbers = range((page - 1) * limit, min(page * limit, SPACEX_LAUNCHES))
+                self._send_json({
+                    "docs": [stub._spacex_launch(number) for number in numbers],
+                    "hasNextPage": page * limit < SPACEX_LAUNCHES,
+                })
+            elif path.startswith("/bot"):
+                self._telegram(path.rstrip("/").rsplit("/", 1)[-1])
+            else:
+                self._send(404, b"{}")
+
+        def _telegram(self, method: str) -> None:
+            if stub.telegram_latency:
+                time.sleep(stub.telegram_latency)
+            if method == "getMe":
+                result = {"id": 1, "is_bot": True, "first_name": "Stub", "username": "stub_bot"}
+            else:
+                result = stub._telegram_message(method)
+            self._send_json({"ok": True, "result": result})
+
+    return Handler
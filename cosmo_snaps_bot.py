@@ -1,19 +1,34 @@
+import argparse
 import os
 import random
+import signal
 import time
-from dotenv import load_dotenv
-import telegram
-import schedule
-from utils import logger
+import metrics
+from image_catalog import VALID_EXTENSIONS, ImageCatalog
+from image_selector import POST_HISTORY_PATH, RECENT_WINDOW, ImageSelector, PostHistory
+from settings import get_settings, parse_source_values
+from telegram_cache import TelegramUploadCache
+from utils import lazy_import, logger, setup_logging
 
+asyncio = lazy_import("asyncio")
+schedule = lazy_import("schedule")
+telegram = lazy_import("telegram")
 
-def send_image_to_telegram(bot, image_path: str, caption: str = None) -> None:
+
+def send_image_to_telegram(bot, image_path: str, caption: str = None, chat_id: str = None,
+                           upload_cache: TelegramUploadCache = None) -> None:
     """Отправляет изображение в Telegram-канал.
 
+    С кэшем загрузок изображение, уже отправленное ранее, публикуется по
+    сохранённому file_id без повторной загрузки, а новое изображение перед
+    загрузкой уменьшается до размера, подходящего для Telegram.
+
     Args:
         bot (telegram.Bot): Объект Telegram-бота.
         image_path (str): Путь к изображению для отправки.
         caption (str, optional): Подпись к изображению. По умолчанию None.
+        chat_id (str, optional): Канал для публикации. По умолчанию TG_CHAT_ID.
+        upload_cache (TelegramUploadCache, optional): Кэш загрузок в Telegram.
 
     Raises:
         OSError: При ошибках открытия файла.
@@ -21,23 +36,55 @@ def send_image_to_telegram(bot, image_path: str, caption: str = None) -> None:
     """
     if not isinstance(image_path, str):
         raise ValueError(f"Некорректный путь к изображению: {image_path}")
+    chat_id = chat_id or get_settings().get("TG_CHAT_ID")
 
     try:
-        with open(image_path, "rb") as photo:
+        cache_key = upload_cache.key(image_path) if upload_cache else None
+        file_id = upload_cache.get_file_id(cache_key) if upload_cache else None
+        if file_id:
+            try:
+                with metrics.timer("telegram_send_seconds", method="file_id"):
+                    bot.send_photo(chat_id=chat_id, photo=file_id, caption=caption)
+                logger.info(f"Изображение отправлено в {chat_id} по file_id: {image_path}")
+                return
+            except telegram.error.BadRequest as e:
+                logger.warning(f"file_id изображения {image_path} недействителен, загружаем заново: {e}")
+                upload_cache.forget(cache_key)
+
+        upload_path = upload_cache.prepare(image_path, cache_key) if upload_cache else image_path
+        with open(upload_path, "rb") as photo:
             try:
-                bot.send_photo(chat_id=os.getenv("TG_CHAT_ID"), photo=photo, caption=caption)
+                with metrics.timer("telegram_send_seconds", method="upload"):
+                    message = bot.send_photo(chat_id=chat_id, photo=photo, caption=caption)
             except telegram.error.TelegramError as e:
                 logger.error(f"Ошибка при отправке изображения {image_path} в Telegram: {e}")
                 raise
     except OSError as e:
         logger.error(f"Ошибка при открытии файла {image_path}: {e}")
         raise
-    logger.info(f"Изображение отправлено: {image_path}")
+    if upload_cache and message and message.photo:
+        upload_cache.remember(cache_key, message.photo[-1].file_id)
+    logger.info(f"Изображение отправлено в {chat_id}: {image_path}")
+
+
+def parse_chat_ids(value: str) -> list:
+    """Разбирает список каналов из строки TG_CHAT_ID, разделённой запятыми.
+
+    Args:
+        value (str): Строка вида '@channel_one,@channel_two'.
+
+    Returns:
+        list: Список идентификаторов каналов.
+    """
+    return [chat_id.strip() for chat_id in (value or "").split(",") if chat_id.strip()]
 
 
 def get_random_image_from_random_folder(image_dirs: list) -> str:
     """Выбирает случайную папку из списка и случайное изображение из неё.
 
+    Читается только выбранная папка. Для регулярных публикаций используйте
+    ImageCatalog: он сканирует папки один раз, а не при каждом выборе.
+
     Args:
         image_dirs (list): Список путей к папкам с изображениями.
 
@@ -46,36 +93,33 @@ def get_random_image_from_random_folder(image_dirs: list) -> str:
 
     Raises:
         ValueError: Если ни одна папка не найдена или в выбранной папке нет изображений.
-        OSError: При ошибках доступа к файловой системе.
     """
-    valid_extensions = (".jpg", ".png")
-
-    existing_dirs = [d for d in image_dirs if os.path.exists(d)]
+    existing_dirs = [d for d in image_dirs if os.path.isdir(d)]
     if not existing_dirs:
         raise ValueError("Ни одна из указанных папок не найдена")
-
-    random.shuffle(existing_dirs)
     chosen_dir = random.choice(existing_dirs)
 
     try:
-        files = os.listdir(chosen_dir)
+        with os.scandir(chosen_dir) as entries:
+            files = [
+                entry.path for entry in entries
+                if entry.name.lower().endswith(VALID_EXTENSIONS) and entry.is_file()
+            ]
     except OSError as e:
         raise ValueError(f"Ошибка при поиске изображений в {chosen_dir}: {e}")
-
-    files = [
-        f for f in files
-        if os.path.isfile(os.path.join(chosen_dir, f)) and f.lower().endswith(valid_extensions)
-    ]
     if not files:
-        raise ValueError(f"В папке {chosen_dir} нет изображений с расширениями {valid_extensions}")
-    return os.path.join(chosen_dir, random.choice(files))
+        raise ValueError(f"В папке {chosen_dir} нет изображений с расширениями {VALID_EXTENSIONS}")
+    return random.choice(files)
 
 
-def publish_image(bot):
+def publish_image(bot, selector: ImageSelector, chat_id: str = None, upload_cache: TelegramUploadCache = None):
     """Публикует случайное изображение в Telegram-канал с подписью.
 
     Args:
         bot (telegram.Bot): Объект Telegram-бота.
+        selector (ImageSelector): Выбор изображения для публикации.
+        chat_id (str, optional): Канал для публикации. По умолчанию TG_CHAT_ID.
+        upload_cache (TelegramUploadCache, optional): Кэш загрузок в Telegram.
     """
     caption_templates = [
         "Космическое фото от @CosmoSnapsBot! Источник: {source} 🚀",
@@ -88,61 +132,194 @@ def publish_image(bot):
         "Путешествие по звёздам с @CosmoSnapsBot! Источник: {source} ⭐"
     ]
 
-    image_dirs = ["nasa_images", "nasa_epic_photos", "spacex_images"]
-    source = None
+    image = None
     try:
-        image_path = get_random_image_from_random_folder(image_dirs)
-        source = (
-            "NASA APOD" if "nasa_images" in image_path else
-            "NASA EPIC" if "nasa_epic_photos" in image_path else
-            "SpaceX"
-        )
-        caption = random.choice(caption_templates).format(source=source)
-        send_image_to_telegram(bot, image_path, caption)
+        selector.catalog.refresh()
+        image = selector.pick()
+        caption = random.choice(caption_templates).format(source=image.source)
+        send_image_to_telegram(bot, image.path, caption, chat_id=chat_id, upload_cache=upload_cache)
+        selector.record(image)
     except ValueError as e:
         logger.error(f"Ошибка: {e}")
-    except (OSError, telegram.error.TelegramError) as e:
+    except OSError as e:
         logger.error(f"Ошибка при публикации изображения: {e}")
+        if image:
+            selector.catalog.discard(image.path)
+    except telegram.error.TelegramError as e:
+        logger.error(f"Ошибка при публикации изображения: {e}")
+
+
+def publish_to_chats(bot, selector: ImageSelector, chat_ids: list, upload_cache: TelegramUploadCache = None) -> None:
+    """Публикует по изображению в каждый канал по очереди.
+
+    Args:
+        bot (telegram.Bot): Объект Telegram-бота.
+        selector (ImageSelector): Выбор изображения для публикации.
+        chat_ids (list): Список каналов.
+        upload_cache (TelegramUploadCache, optional): Кэш загрузок в Telegram.
+    """
+    for chat_id in chat_ids:
+        publish_image(bot, selector, chat_id, upload_cache)
+
+
+async def run_channel(bot, selector: ImageSelector, chat_id: str, interval: float, stop: "asyncio.Event",
+                      upload_cache: TelegramUploadCache = None) -> None:
+    """Публикует изображения в один канал через равные промежутки времени.
 
+    Время следующей публикации отсчитывается от запланированного, а не от
+    фактического времени отправки, поэтому расписание не смещается.
+    Отправка выполняется в отдельном потоке и не блокирует цикл событий.
 
-def main():
+    Args:
+        bot (telegram.Bot): Объект Telegram-бота.
+        selector (ImageSelector): Выбор изображения для публикации.
+        chat_id (str): Канал для публикации.
+        interval (float): Интервал между публикациями в секундах.
+        stop (asyncio.Event): Событие остановки бота.
+        upload_cache (TelegramUploadCache, optional): Кэш загрузок в Telegram.
+    """
+    loop = asyncio.get_running_loop()
+    next_run = loop.time()
+    while not stop.is_set():
+        await asyncio.to_thread(publish_image, bot, selector, chat_id, upload_cache)
+        next_run += interval
+        now = loop.time()
+        if next_run <= now:
+            missed = int((now - next_run) // interval) + 1
+            logger.warning(f"Пропущено публикаций в {chat_id}: {missed}")
+            next_run += missed * interval
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=next_run - now)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_async(bot, selector: ImageSelector, chat_ids: list, interval: float,
+                    upload_cache: TelegramUploadCache = None) -> None:
+    """Запускает публикацию во все каналы одновременно в цикле событий asyncio.
+
+    По сигналу SIGINT или SIGTERM новые публикации прекращаются, а уже
+    начатые отправки завершаются.
+
+    Args:
+        bot (telegram.Bot): Объект Telegram-бота.
+        selector (ImageSelector): Выбор изображения для публикации.
+        chat_ids (list): Список каналов.
+        interval (float): Интервал между публикациями в секундах.
+        upload_cache (TelegramUploadCache, optional): Кэш загрузок в Telegram.
+    """
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signal_number, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass  # Windows: остановка по KeyboardInterrupt
+    tasks = [asyncio.create_task(run_channel(bot, selector, chat_id, interval, stop, upload_cache)) for chat_id in chat_ids]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        stop.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        logger.info("Бот остановлен")
+
+
+def main(runtime: str = "schedule", with_fetcher: bool = False):
     """Основная функция для запуска бота.
 
     Загружает переменные окружения, создаёт объект бота, настраивает расписание
     публикаций и запускает бесконечный цикл для выполнения задач.
 
+    В TG_CHAT_ID можно указать несколько каналов через запятую. В режиме
+    'async' каналы обслуживаются одновременно в цикле событий asyncio,
+    в режиме 'schedule' — по очереди в цикле библиотеки schedule.
+
+    Веса источников задаются переменной TG_SOURCE_WEIGHTS
+    (например, 'NASA APOD=3,NASA EPIC=1,SpaceX=1'), размер окна
+    неповторяемых публикаций — TG_RECENT_WINDOW, файл истории
+    публикаций — TG_POST_HISTORY_FILE.
+
+    С with_fetcher в том же процессе запускается FetchService, который
+    обновляет изображения по расписанию (интервалы — FETCH_*_INTERVAL_HOURS).
+
+    Args:
+        runtime (str, optional): Режим работы: 'schedule' или 'async'. По умолчанию 'schedule'.
+        with_fetcher (bool, optional): Обновлять изображения в фоновом потоке бота. По умолчанию False.
+
     Raises:
-        ValueError: Если отсутствуют необходимые переменные окружения или неверный формат интервала.
+        ValueError: Если отсутствуют необходимые переменные окружения или неверный формат настроек.
     """
-    load_dotenv()
-    token = os.getenv("TG_BOT_TOKEN")
-    chat_id = os.getenv("TG_CHAT_ID")
-    post_interval = os.getenv("TG_POST_INTERVAL_HOURS", "4")
+    settings = get_settings()
+    metrics.configure_metrics()
+    token = settings.get("TG_BOT_TOKEN")
+    chat_ids = parse_chat_ids(settings.get("TG_CHAT_ID"))
+    post_interval = settings.get_float("TG_POST_INTERVAL_HOURS", 4)
+    source_weights = parse_source_values(settings.get("TG_SOURCE_WEIGHTS", ""), "TG_SOURCE_WEIGHTS")
+    history_file = settings.get("TG_POST_HISTORY_FILE", POST_HISTORY_PATH)
+    recent_window = settings.get_int("TG_RECENT_WINDOW", RECENT_WINDOW)
 
     if not token:
         raise ValueError("TG_BOT_TOKEN not found in .env")
-    if not chat_id:
+    if not chat_ids:
         raise ValueError("TG_CHAT_ID not found in .env")
 
-    try:
-        post_interval = float(post_interval)
-    except ValueError:
-        raise ValueError("TG_POST_INTERVAL_HOURS must be a number")
-
-    bot = telegram.Bot(token=token)
+    # Одновременные отправки в несколько каналов должны переиспользовать соединения
+    request = telegram.utils.request.Request(con_pool_size=len(chat_ids) + 4)
+    bot = telegram.Bot(token=token, request=request)
+    history = PostHistory(history_file, window=recent_window)
+    selector = ImageSelector(ImageCatalog(), weights=source_weights, history=history)
+    upload_cache = TelegramUploadCache()
 
     print(bot.get_me())
     print(f"Текущая рабочая директория: {os.getcwd()}")
     print(f"Частота публикации: каждые {post_interval} часов")
+    print(f"Каналы: {', '.join(chat_ids)}")
 
-    schedule.every(post_interval).hours.do(publish_image, bot=bot)
+    fetch_service = None
+    if with_fetcher:
+        from fetch_service import FetchService, get_fetch_intervals
+        from image_utils import get_api_key
 
-    publish_image(bot)
+        fetch_service = FetchService(get_api_key("NASA_API_KEY"), intervals=get_fetch_intervals())
+        fetch_service.start()
 
-    while True:
-        schedule.run_pending()
-        time.sleep(60)
+    try:
+        if runtime == "async":
+            asyncio.run(run_async(bot, selector, chat_ids, post_interval * 3600, upload_cache))
+            return
+
+        schedule.every(post_interval).hours.do(
+            publish_to_chats, bot=bot, selector=selector, chat_ids=chat_ids, upload_cache=upload_cache
+        )
+
+        publish_to_chats(bot, selector, chat_ids, upload_cache)
+
+        while True:
+            schedule.run_pending()
+            time.sleep(60)
+    finally:
+        if fetch_service:
+            fetch_service.stop()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Публикация космических фотографий в Telegram")
+    parser.add_argument(
+        "--runtime",
+        choices=("schedule", "async"),
+        default="schedule",
+        help="Режим работы: schedule — цикл с проверкой раз в минуту, "
+             "async — точные таймеры asyncio и одновременная публикация в несколько каналов (по умолчанию schedule)"
+    )
+    parser.add_argument(
+        "--with_fetcher",
+        action="store_true",
+        help="Обновлять изображения всех источников по расписанию в том же процессе"
+    )
+    args = parser.parse_args()
+
+    setup_logging()
+    try:
+        main(runtime=args.runtime, with_fetcher=args.with_fetcher)
+    except KeyboardInterrupt:
+        logger.info("Бот остановлен")
\ No newline at end of file
@@ -0,0 +1,237 @@
+import argparse
+import hashlib
+import json
+import os
+import threading
+from settings import get_settings
+from utils import lazy_import, logger, setup_logging
+
+Image = lazy_import("PIL.Image")  # None, если Pillow не установлен
+
+
+CONTENT_INDEX_PATH = ".content_index.jsonl"  # Общий индекс хэшей для всех папок с изображениями
+PHASH_MAX_DISTANCE = 6  # Максимальное расстояние Хэмминга между перцептивными хэшами дубликатов
+DEDUP_MODES = ("skip", "link", "off")  # Что делать с дубликатом: не сохранять, жёсткая ссылка, не проверять
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".webp")
+
+
+def file_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Считает SHA-256 файла, читая его порциями.
+
+    Args:
+        path (str): Путь к файлу.
+        chunk_size (int, optional): Размер порции чтения в байтах.
+
+    Returns:
+        str: Хэш в шестнадцатеричном виде.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def perceptual_hash(path: str) -> int | None:
+    """Считает 64-битный разностный перцептивный хэш (dHash) изображения.
+
+    Args:
+        path (str): Путь к изображению.
+
+    Returns:
+        int | None: Хэш или None, если Pillow не установлен или файл не декодируется.
+    """
+    if Image is None:
+        return None
+    try:
+        with Image.open(path) as image:
+            pixels = list(image.convert("L").resize((9, 8)).getdata())
+    except (OSError, ValueError) as e:
+        logger.warning(f"Не удалось посчитать перцептивный хэш {path}: {e}")
+        return None
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = (bits << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return bits
+
+
+class ContentStore:
+    """Индекс содержимого изображений по SHA-256 и перцептивным хэшам.
+
+    Общий для nasa_images, nasa_epic_photos и spacex_images: позволяет
+    обнаружить дубликат до того, как он будет сохранён в папку.
+
+    Args:
+        path (str, optional): Путь к файлу индекса в формате JSON Lines.
+        perceptual (bool, optional): Искать также визуально похожие изображения.
+            Требует Pillow.
+        max_distance (int, optional): Порог расстояния Хэмминга для перцептивных хэшей.
+    """
+
+    def __init__(self, path: str = CONTENT_INDEX_PATH, perceptual: bool = False,
+                 max_distance: int = PHASH_MAX_DISTANCE):
+        if perceptual and Image is None:
+            logger.warning("Pillow не установлен, поиск похожих изображений отключён")
+            perceptual = False
+        self.path = path
+        self.perceptual = perceptual
+        self.max_distance = max_distance
+        self._by_sha = {}
+        self._phashes = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    self._by_sha.setdefault(entry["sha256"], entry["path"])
+                    if entry.get("phash") is not None:
+                        self._phashes.setdefault(entry["path"], entry["phash"])
+                except (ValueError, KeyError, TypeError):
+                    continue
+
+    def _find_locked(self, sha256: str, phash: int | None) -> str | None:
+        existing = self._by_sha.get(sha256)
+        if existing and os.path.exists(existing):
+            return existing
+        if phash is None:
+            return None
+        for path, other in list(self._phashes.items()):
+            if bin(phash ^ other).count("1") <= self.max_distance:
+                if os.path.exists(path):
+                    return path
+                del self._phashes[path]
+        return None
+
+    def claim(self, path: str, sha256: str, image_path: str = None) -> str | None:
+        """Проверяет изображение на дубликат и, если дубликата нет, регистрирует его.
+
+        Args:
+            path (str): Итоговый путь, под которым изображение будет сохранено.
+            sha256 (str): SHA-256 содержимого.
+            image_path (str, optional): Путь к файлу с содержимым для перцептивного
+                хэша, если он ещё не лежит по пути path.
+
+        Returns:
+            str | None: Путь к уже сохранённому дубликату или None.
+        """
+        phash = perceptual_hash(image_path or path) if self.perceptual else None
+        with self._lock:
+            duplicate = self._find_locked(sha256, phash)
+            if duplicate:
+                return None if os.path.abspath(duplicate) == os.path.abspath(path) else duplicate
+            self._by_sha[sha256] = path
+            if phash is not None:
+                self._phashes[path] = phash
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"sha256": sha256, "path": path, "phash": phash}) + "\n")
+        return None
+
+
+_content_store = None
+_content_store_lock = threading.Lock()
+
+
+def get_content_store() -> ContentStore:
+    """Возвращает общий индекс содержимого, создавая его при первом обращении.
+
+    Поиск визуально похожих изображений включается переменной окружения
+    DEDUP_PERCEPTUAL=1.
+
+    Returns:
+        ContentStore: Общий индекс содержимого.
+    """
+    global _content_store
+    with _content_store_lock:
+        if _content_store is None:
+            _content_store = ContentStore(perceptual=get_settings().get("DEDUP_PERCEPTUAL") == "1")
+        return _content_store
+
+
+def replace_with_link(source: str, target: str) -> None:
+    """Заменяет файл target жёсткой ссылкой на source.
+
+    Args:
+        source (str): Оригинальный файл.
+        target (str): Файл-дубликат, который станет ссылкой.
+
+    Raises:
+        OSError: Если жёсткую ссылку создать нельзя (например, разные файловые системы).
+    """
+    tmp_path = f"{target}.link"
+    os.link(source, tmp_path)
+    os.replace(tmp_path, target)
+
+
+def dedup_directories(image_dirs: list, mode: str = "link", store: ContentStore = None) -> int:
+    """Находит дубликаты среди уже скачанных изображений.
+
+    Args:
+        image_dirs (list): Список папок с изображениями.
+        mode (str, optional): 'link' — заменить дубликаты жёсткими ссылками,
+            'skip' — удалить дубликаты.
+        store (ContentStore, optional): Индекс содержимого. По умолчанию общий.
+
+    Returns:
+        int: Количество найденных дубликатов.
+
+    Raises:
+        ValueError: Если режим не поддерживается.
+    """
+    if mode not in ("skip", "link"):
+        raise ValueError(f"Неизвестный режим удаления дубликатов: {mode}")
+    store = store or get_content_store()
+    duplicates = 0
+    for image_dir in image_dirs:
+        if not os.path.isdir(image_dir):
+            continue
+        for filename in sorted(os.listdir(image_dir)):
+            path = os.path.join(image_dir, filename)
+            if not filename.lower().endswith(IMAGE_EXTENSIONS) or not os.path.isfile(path):
+                continue
+            duplicate = store.claim(path, file_sha256(path))
+            if not duplicate or os.path.samefile(duplicate, path):
+                continue
+            duplicates += 1
+            try:
+                if mode == "link":
+                    replace_with_link(duplicate, path)
+                    logger.info(f"Дубликат {path} заменён ссылкой на {duplicate}")
+                else:
+                    os.remove(path)
+                    logger.info(f"Дубликат {path} удалён, оригинал: {duplicate}")
+            except OSError as e:
+                logger.error(f"Ошибка при обработке дубликата {path}: {e}")
+    return duplicates
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Поиск и удаление дубликатов среди скачанных изображений")
+    parser.add_argument(
+        "image_dirs",
+        nargs="*",
+        default=["nasa_images", "nasa_epic_photos", "spacex_images"],
+        help="Папки с изображениями (по умолчанию nasa_images, nasa_epic_photos, spacex_images)"
+    )
+    parser.add_argument(
+        "--mode",
+        choices=("skip", "link"),
+        default="link",
+        help="link — заменить дубликаты жёсткими ссылками, skip — удалить их (по умолчанию link)"
+    )
+    parser.add_argument(
+        "--perceptual",
+        action="store_true",
+        help="Искать также визуально похожие изображения (требует Pillow)"
+    )
+    args = parser.parse_args()
+
+    setup_logging()
+    store = ContentStore(perceptual=args.perceptual) if args.perceptual else get_content_store()
+    found = dedup_directories(args.image_dirs, mode=args.mode, store=store)
+    logger.info(f"Найдено дубликатов: {found}")
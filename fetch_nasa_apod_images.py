@@ -1,11 +1,54 @@
 import argparse
-from dotenv import load_dotenv
+import json
 import os
-import requests
-from utils import logger
-from image_utils import download_image, get_api_key
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, timedelta
+import metrics
+from utils import lazy_import, logger, setup_logging
+from image_utils import (
+    DEFAULT_WORKERS, DownloadEngine, add_download_arguments, download_jobs,
+    get_api_key, http_get, plan_download,
+)
 
-def main(api_key: str, save_dir: str = "nasa_images", count: int = 30, max_images: int = 100) -> None:
+requests = lazy_import("requests")
+
+APOD_API_URL = "https://api.nasa.gov/planetary/apod"
+APOD_FIRST_DATE = date(1995, 6, 16)  # Дата первой публикации APOD
+BACKFILL_WINDOW_DAYS = 30  # Сколько дней запрашивать за один вызов API при архивной загрузке
+CHECKPOINT_FILENAME = ".apod_backfill.json"  # Файл с прогрессом архивной загрузки внутри save_dir
+
+def plan_apod_jobs(apod_records: list, save_dir: str, refresh: bool = False) -> list:
+    """Создаёт задания на загрузку для записей APOD с изображениями.
+
+    Args:
+        apod_records (list): Записи, полученные от APOD API.
+        save_dir (str): Папка для сохранения изображений.
+        refresh (bool, optional): Перепроверить уже скачанные изображения.
+
+    Returns:
+        list: Задания DownloadJob для ещё не скачанных изображений.
+    """
+    jobs = []
+    known = 0
+    for apod_entry in apod_records:
+        if apod_entry.get("media_type") == "image" and apod_entry.get("url"):
+            key = f"apod:{apod_entry['date']}" if apod_entry.get("date") else apod_entry["url"]
+            job = plan_download(apod_entry["url"], save_dir, key, prefix="nasa_apod", refresh=refresh)
+            if job:
+                jobs.append(job)
+            else:
+                known += 1
+        else:
+            logger.warning(f"Пропущено (не изображение или нет URL): {apod_entry.get('title', 'без названия')}")
+    if known:
+        logger.info(f"Пропущено уже скачанных изображений: {known}")
+    return jobs
+
+@metrics.timed("fetch_seconds", source="NASA APOD")
+def main(api_key: str, save_dir: str = "nasa_images", count: int = 30, max_images: int = 100,
+         workers: int = DEFAULT_WORKERS, refresh: bool = False, dedup: str = "skip",
+         engine: DownloadEngine = None) -> None:
     """Получает и сохраняет фотографии дня NASA APOD.
 
     Args:
@@ -13,6 +56,10 @@ def main(api_key: str, save_dir: str = "nasa_images", count: int = 30, max_image
         save_dir (str, optional): Папка для сохранения изображений. По умолчанию 'nasa_images'.
         count (int, optional): Количество изображений для загрузки (максимум 100). По умолчанию 30.
         max_images (int, optional): Максимальное количество изображений для загрузки. По умолчанию 100.
+        workers (int, optional): Количество параллельных загрузок.
+        refresh (bool, optional): Перепроверить уже скачанные изображения. По умолчанию они пропускаются.
+        dedup (str, optional): Обработка дубликатов: 'skip', 'link' или 'off'. По умолчанию 'skip'.
+        engine (DownloadEngine, optional): Общий движок загрузки. Если передан, workers и dedup не используются.
 
     Raises:
         requests.exceptions.HTTPError: Ошибки при выполнении HTTP-запроса.
@@ -27,22 +74,170 @@ def main(api_key: str, save_dir: str = "nasa_images", count: int = 30, max_image
         "count": count,
         "thumbs": True
     }
-    url = "https://api.nasa.gov/planetary/apod"
 
-    response = requests.get(url, params=params, timeout=30)
+    response = http_get(APOD_API_URL, params=params)
     response.raise_for_status()
     apod_records = response.json()
 
-    image_index = 0
-    for _, apod_entry in enumerate(apod_records):
-        if apod_entry.get("media_type") == "image" and apod_entry.get("url"):
+    jobs = plan_apod_jobs(apod_records, save_dir, refresh)
+    download_jobs(jobs, engine, workers=workers, dedup=dedup)
+
+def split_date_range(start_date: date, end_date: date, window_days: int) -> list:
+    """Разбивает диапазон дат на окна фиксированной длины.
+
+    Args:
+        start_date (date): Первая дата диапазона.
+        end_date (date): Последняя дата диапазона (включительно).
+        window_days (int): Длина окна в днях.
+
+    Returns:
+        list: Список пар (начало, конец) окон.
+    """
+    windows = []
+    window_start = start_date
+    while window_start <= end_date:
+        window_end = min(end_date, window_start + timedelta(days=window_days - 1))
+        windows.append((window_start, window_end))
+        window_start = window_end + timedelta(days=1)
+    return windows
+
+def fetch_apod_window(api_key: str, start_date: date, end_date: date) -> list:
+    """Получает записи APOD за диапазон дат одним запросом.
+
+    Args:
+        api_key (str): API-ключ для доступа к NASA API.
+        start_date (date): Первая дата.
+        end_date (date): Последняя дата (включительно).
+
+    Returns:
+        list: Записи APOD.
+
+    Raises:
+        requests.exceptions.RequestException: Ошибки при выполнении HTTP-запроса.
+    """
+    params = {
+        "api_key": api_key,
+        "start_date": start_date.isoformat(),
+        "end_date": end_date.isoformat(),
+        "thumbs": True
+    }
+    response = http_get(APOD_API_URL, params=params)
+    response.raise_for_status()
+    return response.json()
+
+def load_checkpoint(save_dir: str) -> set:
+    """Читает список уже обработанных окон архивной загрузки.
+
+    Args:
+        save_dir (str): Папка с изображениями.
+
+    Returns:
+        set: Ключи обработанных окон вида 'YYYY-MM-DD:YYYY-MM-DD'.
+    """
+    path = os.path.join(save_dir, CHECKPOINT_FILENAME)
+    if not os.path.exists(path):
+        return set()
+    try:
+        with open(path, encoding="utf-8") as f:
+            return set(json.load(f).get("completed", []))
+    except (OSError, ValueError) as e:
+        logger.warning(f"Не удалось прочитать прогресс загрузки {path}: {e}")
+        return set()
+
+def save_checkpoint(save_dir: str, completed: set) -> None:
+    """Атомарно сохраняет список обработанных окон архивной загрузки.
+
+    Args:
+        save_dir (str): Папка с изображениями.
+        completed (set): Ключи обработанных окон.
+    """
+    os.makedirs(save_dir, exist_ok=True)
+    path = os.path.join(save_dir, CHECKPOINT_FILENAME)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump({"completed": sorted(completed)}, f)
+    os.replace(f"{path}.tmp", path)
+
+def backfill(api_key: str, start_date: date, end_date: date = None, save_dir: str = "nasa_images",
+             window_days: int = BACKFILL_WINDOW_DAYS, workers: int = DEFAULT_WORKERS,
+             refresh: bool = False, dedup: str = "skip") -> None:
+    """Скачивает архив APOD за диапазон дат.
+
+    Диапазон разбивается на окна по window_days дней, которые запрашиваются
+    параллельно (частоту запросов ограничивает общий HTTP-клиент). Записи
+    каждого окна сразу ставятся в очередь загрузки, не дожидаясь остальных
+    окон. Окно, все изображения которого скачаны, отмечается в файле
+    прогресса, поэтому прерванную загрузку можно продолжить повторным запуском.
+
+    Args:
+        api_key (str): API-ключ для доступа к NASA API.
+        start_date (date): Первая дата диапазона.
+        end_date (date, optional): Последняя дата диапазона. По умолчанию сегодня.
+        save_dir (str, optional): Папка для сохранения изображений. По умолчанию 'nasa_images'.
+        window_days (int, optional): Длина окна в днях.
+        workers (int, optional): Количество параллельных загрузок.
+        refresh (bool, optional): Перепроверить уже скачанные изображения.
+        dedup (str, optional): Обработка дубликатов: 'skip', 'link' или 'off'. По умолчанию 'skip'.
+
+    Raises:
+        ValueError: Если диапазон дат некорректен.
+    """
+    end_date = end_date or date.today()
+    if start_date < APOD_FIRST_DATE:
+        raise ValueError(f"Архив APOD начинается с {APOD_FIRST_DATE.isoformat()}")
+    if start_date > end_date:
+        raise ValueError("Начальная дата позже конечной")
+    if window_days < 1:
+        raise ValueError("Длина окна должна быть больше нуля")
+
+    completed = load_checkpoint(save_dir)
+    windows = [
+        window for window in split_date_range(start_date, end_date, window_days)
+        if f"{window[0].isoformat()}:{window[1].isoformat()}" not in completed
+    ]
+    logger.info(f"Окон для загрузки: {len(windows)} (уже обработано: {len(completed)})")
+    if not windows:
+        return
+
+    lock = threading.Lock()
+
+    def finish_window(window_key: str, download_futures: list) -> None:
+        if all(future.result() for future in download_futures):
+            with lock:
+                completed.add(window_key)
+                save_checkpoint(save_dir, completed)
+            logger.info(f"Окно {window_key} загружено")
+
+    def track_window(window_key: str, download_futures: list) -> None:
+        remaining = [len(download_futures)]
+
+        def on_done(_future) -> None:
+            with lock:
+                remaining[0] -= 1
+                done = remaining[0] == 0
+            if done:
+                finish_window(window_key, download_futures)
+
+        for future in download_futures:
+            future.add_done_callback(on_done)
+
+    with DownloadEngine(workers=workers, dedup=dedup) as engine, \
+            ThreadPoolExecutor(max_workers=min(workers, len(windows)), thread_name_prefix="apod") as pool:
+        metadata_futures = {}
+        for window_start, window_end in windows:
+            future = pool.submit(fetch_apod_window, api_key, window_start, window_end)
+            metadata_futures[future] = f"{window_start.isoformat()}:{window_end.isoformat()}"
+        for metadata_future in as_completed(metadata_futures):
+            window_key = metadata_futures[metadata_future]
             try:
-                download_image(apod_entry["url"], save_dir, image_index, prefix="nasa_apod", params=None)
-                image_index += 1
-            except (ValueError, requests.exceptions.RequestException, OSError) as e:
-                logger.error(f"Ошибка при загрузке {apod_entry.get('url', 'без URL')}: {e}")
-        else:
-            logger.warning(f"Пропущено (не изображение или нет URL): {apod_entry.get('title', 'без названия')}")
+                apod_records = metadata_future.result()
+            except (ValueError, requests.exceptions.RequestException) as e:
+                logger.error(f"Ошибка при получении записей APOD за {window_key}: {e}")
+                continue
+            jobs = plan_apod_jobs(apod_records, save_dir, refresh)
+            if jobs:
+                track_window(window_key, [engine.submit(job) for job in jobs])
+            else:
+                finish_window(window_key, [])
 
 if __name__ == "__main__":
     MAX_APOD_IMAGES = 100  # Максимальное количество изображений для загрузки через NASA APOD API
@@ -64,11 +259,35 @@ if __name__ == "__main__":
         type=str,
         help="API-ключ (если не указан — берётся из .env)"
     )
+    parser.add_argument(
+        "--start_date",
+        type=date.fromisoformat,
+        help="Архивная загрузка: первая дата в формате ГГГГ-ММ-ДД (вместо случайных --count изображений)"
+    )
+    parser.add_argument(
+        "--end_date",
+        type=date.fromisoformat,
+        help="Архивная загрузка: последняя дата в формате ГГГГ-ММ-ДД (по умолчанию сегодня)"
+    )
+    parser.add_argument(
+        "--window_days",
+        type=int,
+        default=BACKFILL_WINDOW_DAYS,
+        help=f"Архивная загрузка: сколько дней запрашивать за один вызов API (по умолчанию {BACKFILL_WINDOW_DAYS})"
+    )
+    add_download_arguments(parser)
     args = parser.parse_args()
 
+    setup_logging()
+    metrics.configure_metrics()
     try:
         api_key = get_api_key("NASA_API_KEY", args.api_key)
-        main(api_key=api_key, count=args.count, save_dir=args.save_dir, max_images=MAX_APOD_IMAGES)
+        if args.start_date:
+            backfill(api_key=api_key, start_date=args.start_date, end_date=args.end_date, save_dir=args.save_dir,
+                     window_days=args.window_days, workers=args.workers, refresh=args.refresh, dedup=args.dedup)
+        else:
+            main(api_key=api_key, count=args.count, save_dir=args.save_dir, max_images=MAX_APOD_IMAGES,
+                 workers=args.workers, refresh=args.refresh, dedup=args.dedup)
     except (ValueError, requests.exceptions.RequestException) as e:
         logger.error(f"Ошибка: {e}")
-        raise
\ No newline at end of file
+        raise
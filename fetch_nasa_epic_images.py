@@ -1,13 +1,80 @@
 import argparse
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime
 from urllib.parse import urlencode
-from dotenv import load_dotenv
-import os
-import requests
-from utils import logger
-from image_utils import download_image, get_api_key
+import metrics
+from utils import lazy_import, logger, setup_logging
+from image_utils import (
+    DEFAULT_WORKERS, DownloadEngine, add_download_arguments, download_jobs,
+    get_api_key, http_get, plan_download,
+)
 
-def main(count: int = 10, save_dir: str = "epic_images", api_key: str = None, max_images: int = 10) -> None:
+requests = lazy_import("requests")
+
+EPIC_API_URL = "https://api.nasa.gov/EPIC/api"
+EPIC_ARCHIVE_URL = "https://api.nasa.gov/EPIC/archive"
+EPIC_COLLECTIONS = ("natural", "enhanced")  # Коллекции снимков EPIC
+EPIC_VARIANTS = {"png": "png", "jpg": "jpg", "thumbs": "jpg"}  # Вариант архива -> расширение файла
+
+def get_image_url(epic_record: dict, collection: str = "natural", variant: str = "png") -> str:
+    """Формирует URL снимка EPIC в архиве.
+
+    Args:
+        epic_record (dict): Запись о снимке от EPIC API.
+        collection (str, optional): Коллекция: 'natural' или 'enhanced'.
+        variant (str, optional): Вариант архива: 'png', 'jpg' или 'thumbs'.
+
+    Returns:
+        str: URL снимка.
+
+    Raises:
+        ValueError: Если дата снимка имеет неверный формат.
+    """
+    img_date = datetime.strptime(epic_record["date"], "%Y-%m-%d %H:%M:%S")
+    date_path = img_date.strftime("%Y/%m/%d")
+    return (
+        f"{EPIC_ARCHIVE_URL}/{collection}/"
+        f"{date_path}/{variant}/{epic_record['image']}.{EPIC_VARIANTS[variant]}"
+    )
+
+def plan_epic_jobs(epic_records: list, save_dir: str, api_key: str, collection: str = "natural",
+                   variant: str = "png", refresh: bool = False) -> list:
+    """Создаёт задания на загрузку для записей EPIC.
+
+    Args:
+        epic_records (list): Записи о снимках от EPIC API.
+        save_dir (str): Папка для сохранения изображений.
+        api_key (str): API-ключ для доступа к NASA API.
+        collection (str, optional): Коллекция: 'natural' или 'enhanced'.
+        variant (str, optional): Вариант архива: 'png', 'jpg' или 'thumbs'.
+        refresh (bool, optional): Перепроверить уже скачанные изображения.
+
+    Returns:
+        list: Задания DownloadJob для ещё не скачанных снимков.
+    """
+    jobs = []
+    known = 0
+    for epic_record in epic_records:
+        try:
+            image_url = get_image_url(epic_record, collection, variant)
+        except ValueError as e:
+            logger.error(f"Ошибка формата даты для изображения {epic_record.get('image', 'без имени')}: {e}")
+            continue
+        key = f"epic:{epic_record['image']}" if variant == "png" else f"epic:{epic_record['image']}:{variant}"
+        job = plan_download(image_url, save_dir, key, prefix="nasa_epic", params={"api_key": api_key},
+                            refresh=refresh)
+        if job:
+            jobs.append(job)
+        else:
+            known += 1
+    if known:
+        logger.info(f"Пропущено уже скачанных изображений: {known}")
+    return jobs
+
+@metrics.timed("fetch_seconds", source="NASA EPIC")
+def main(count: int = 10, save_dir: str = "epic_images", api_key: str = None, max_images: int = 10,
+         workers: int = DEFAULT_WORKERS, refresh: bool = False, dedup: str = "skip", variant: str = "png",
+         engine: DownloadEngine = None) -> None:
     """Скачивает изображения Земли через NASA EPIC API.
 
     Args:
@@ -15,6 +82,11 @@ def main(count: int = 10, save_dir: str = "epic_images", api_key: str = None, ma
         save_dir (str, optional): Папка для сохранения изображений. По умолчанию 'epic_images'.
         api_key (str): API-ключ для доступа к NASA API.
         max_images (int, optional): Максимальное количество изображений для загрузки. По умолчанию 10.
+        workers (int, optional): Количество параллельных загрузок.
+        refresh (bool, optional): Перепроверить уже скачанные изображения. По умолчанию они пропускаются.
+        dedup (str, optional): Обработка дубликатов: 'skip', 'link' или 'off'. По умолчанию 'skip'.
+        variant (str, optional): Вариант архива: 'png', 'jpg' или 'thumbs'. По умолчанию 'png'.
+        engine (DownloadEngine, optional): Общий движок загрузки. Если передан, workers и dedup не используются.
 
     Raises:
         ValueError: Если count превышает допустимое значение.
@@ -24,24 +96,107 @@ def main(count: int = 10, save_dir: str = "epic_images", api_key: str = None, ma
         raise ValueError(f"Максимальное количество изображений для загрузки: 10")
 
     params = {"api_key": api_key}
-    epic_api_url = "https://api.nasa.gov/EPIC/api/natural/images"
-    response = requests.get(epic_api_url, params=params, timeout=30)
+    epic_api_url = f"{EPIC_API_URL}/natural/images"
+    response = http_get(epic_api_url, params=params)
     response.raise_for_status()
     epic_records = response.json()[:count]
 
-    for i, epic_record in enumerate(epic_records):
-        try:
-            img_date = datetime.strptime(epic_record["date"], "%Y-%m-%d %H:%M:%S")
-            date_path = img_date.strftime("%Y/%m/%d")
-            image_url = (
-                f"https://api.nasa.gov/EPIC/archive/natural/"
-                f"{date_path}/png/{epic_record['image']}.png"
-            )
-            download_image(image_url, save_dir, i, prefix="nasa_epic", params={"api_key": api_key})
-        except ValueError as e:
-            logger.error(f"Ошибка формата даты для изображения {epic_record.get('image', 'без имени')}: {e}")
-        except (requests.exceptions.RequestException, OSError) as e:
-            logger.error(f"Ошибка при загрузке изображения {epic_record.get('image', 'без имени')}: {e}")
+    jobs = plan_epic_jobs(epic_records, save_dir, api_key, variant=variant, refresh=refresh)
+    download_jobs(jobs, engine, workers=workers, dedup=dedup)
+
+def get_available_dates(api_key: str, collection: str) -> list:
+    """Получает список дат, за которые в коллекции EPIC есть снимки.
+
+    Args:
+        api_key (str): API-ключ для доступа к NASA API.
+        collection (str): Коллекция: 'natural' или 'enhanced'.
+
+    Returns:
+        list: Отсортированный список дат (date).
+
+    Raises:
+        requests.exceptions.RequestException: Ошибки при выполнении HTTP-запроса.
+    """
+    response = http_get(f"{EPIC_API_URL}/{collection}/available", params={"api_key": api_key})
+    response.raise_for_status()
+    return sorted(date.fromisoformat(day) for day in response.json())
+
+def fetch_epic_day(api_key: str, collection: str, day: date) -> list:
+    """Получает записи о снимках коллекции EPIC за один день.
+
+    Args:
+        api_key (str): API-ключ для доступа к NASA API.
+        collection (str): Коллекция: 'natural' или 'enhanced'.
+        day (date): День.
+
+    Returns:
+        list: Записи о снимках.
+
+    Raises:
+        requests.exceptions.RequestException: Ошибки при выполнении HTTP-запроса.
+    """
+    response = http_get(f"{EPIC_API_URL}/{collection}/date/{day.isoformat()}", params={"api_key": api_key})
+    response.raise_for_status()
+    return response.json()
+
+def fetch_archive(api_key: str, start_date: date, end_date: date = None, save_dir: str = "nasa_epic_photos",
+                  collections: tuple = ("natural",), variant: str = "png", workers: int = DEFAULT_WORKERS,
+                  refresh: bool = False, dedup: str = "skip") -> None:
+    """Скачивает снимки EPIC за диапазон дат из одной или нескольких коллекций.
+
+    Даты берутся из списка доступных дат каждой коллекции. Записи за каждый
+    день запрашиваются параллельно, и снимки дня ставятся в очередь загрузки
+    сразу после получения его записей, не дожидаясь остальных дней.
+
+    Args:
+        api_key (str): API-ключ для доступа к NASA API.
+        start_date (date): Первая дата диапазона.
+        end_date (date, optional): Последняя дата диапазона. По умолчанию сегодня.
+        save_dir (str, optional): Папка для сохранения изображений. По умолчанию 'nasa_epic_photos'.
+        collections (tuple, optional): Коллекции: 'natural' и/или 'enhanced'.
+        variant (str, optional): Вариант архива: 'png', 'jpg' или 'thumbs' (в 10 раз меньше png).
+        workers (int, optional): Количество параллельных загрузок.
+        refresh (bool, optional): Перепроверить уже скачанные изображения.
+        dedup (str, optional): Обработка дубликатов: 'skip', 'link' или 'off'. По умолчанию 'skip'.
+
+    Raises:
+        ValueError: Если диапазон дат, коллекция или вариант архива некорректны.
+        requests.exceptions.RequestException: Ошибки при получении списка доступных дат.
+    """
+    end_date = end_date or date.today()
+    if start_date > end_date:
+        raise ValueError("Начальная дата позже конечной")
+    unknown = set(collections) - set(EPIC_COLLECTIONS)
+    if unknown:
+        raise ValueError(f"Неизвестные коллекции EPIC: {', '.join(sorted(unknown))}")
+    if variant not in EPIC_VARIANTS:
+        raise ValueError(f"Неизвестный вариант архива EPIC: {variant}")
+
+    days = [
+        (collection, day)
+        for collection in collections
+        for day in get_available_dates(api_key, collection)
+        if start_date <= day <= end_date
+    ]
+    logger.info(f"Дней со снимками EPIC в диапазоне: {len(days)}")
+    if not days:
+        return
+
+    with DownloadEngine(workers=workers, dedup=dedup) as engine, \
+            ThreadPoolExecutor(max_workers=min(workers, len(days)), thread_name_prefix="epic") as pool:
+        metadata_futures = {
+            pool.submit(fetch_epic_day, api_key, collection, day): (collection, day)
+            for collection, day in days
+        }
+        for metadata_future in as_completed(metadata_futures):
+            collection, day = metadata_futures[metadata_future]
+            try:
+                epic_records = metadata_future.result()
+            except (ValueError, requests.exceptions.RequestException) as e:
+                logger.error(f"Ошибка при получении снимков EPIC {collection} за {day.isoformat()}: {e}")
+                continue
+            for job in plan_epic_jobs(epic_records, save_dir, api_key, collection, variant, refresh):
+                engine.submit(job)
 
 if __name__ == "__main__":
     MAX_EPIC_IMAGES = 10  # Максимальное количество изображений для загрузки через NASA EPIC API
@@ -63,11 +218,43 @@ if __name__ == "__main__":
         type=str,
         help="API-ключ (если не указан — берётся из .env)"
     )
+    parser.add_argument(
+        "--variant",
+        choices=tuple(EPIC_VARIANTS),
+        default="png",
+        help="Вариант архива: png, jpg или thumbs — уменьшенные копии (по умолчанию png)"
+    )
+    parser.add_argument(
+        "--start_date",
+        type=date.fromisoformat,
+        help="Архивная загрузка: первая дата в формате ГГГГ-ММ-ДД (вместо последних --count снимков)"
+    )
+    parser.add_argument(
+        "--end_date",
+        type=date.fromisoformat,
+        help="Архивная загрузка: последняя дата в формате ГГГГ-ММ-ДД (по умолчанию сегодня)"
+    )
+    parser.add_argument(
+        "--collections",
+        nargs="+",
+        choices=EPIC_COLLECTIONS,
+        default=["natural"],
+        help="Архивная загрузка: коллекции natural и/или enhanced (по умолчанию natural)"
+    )
+    add_download_arguments(parser)
     args = parser.parse_args()
 
+    setup_logging()
+    metrics.configure_metrics()
     try:
         api_key = get_api_key("NASA_API_KEY", args.api_key)
-        main(count=args.count, save_dir=args.save_dir, api_key=api_key, max_images=MAX_EPIC_IMAGES)
+        if args.start_date:
+            fetch_archive(api_key=api_key, start_date=args.start_date, end_date=args.end_date,
+                          save_dir=args.save_dir, collections=tuple(args.collections), variant=args.variant,
+                          workers=args.workers, refresh=args.refresh, dedup=args.dedup)
+        else:
+            main(count=args.count, save_dir=args.save_dir, api_key=api_key, max_images=MAX_EPIC_IMAGES,
+                 workers=args.workers, refresh=args.refresh, dedup=args.dedup, variant=args.variant)
     except (ValueError, requests.exceptions.RequestException) as e:
         logger.error(f"Ошибка: {e}")
-        raise
\ No newline at end of file
+        raise
@@ -0,0 +1,169 @@
+import argparse
+import threading
+import time
+import fetch_nasa_apod_images
+import fetch_nasa_epic_images
+import fetch_spacex_images
+import metrics
+from image_catalog import IMAGE_SOURCES
+from image_utils import DEFAULT_WORKERS, DownloadEngine, get_api_key
+from settings import get_settings
+from utils import lazy_import, logger, setup_logging
+
+requests = lazy_import("requests")
+
+
+FETCH_INTERVALS_HOURS = {
+    "NASA APOD": 24,
+    "NASA EPIC": 6,
+    "SpaceX": 24,
+}  # Интервалы обновления источников по умолчанию (часы, 0 — не обновлять)
+FETCH_INTERVAL_ENV = {
+    "NASA APOD": "FETCH_APOD_INTERVAL_HOURS",
+    "NASA EPIC": "FETCH_EPIC_INTERVAL_HOURS",
+    "SpaceX": "FETCH_SPACEX_INTERVAL_HOURS",
+}  # Переменные окружения для переопределения интервалов
+APOD_FETCH_COUNT = 30  # Сколько случайных изображений APOD запрашивать за одно обновление
+
+
+class FetchService:
+    """Сервис, который периодически обновляет изображения всех источников.
+
+    Скрипты загрузки вызываются как обычные функции в одном процессе:
+    все источники используют общий движок загрузки и общий HTTP-клиент.
+    Сервис можно запустить в отдельном потоке рядом с ботом (start/stop)
+    или как самостоятельный процесс (run).
+
+    Args:
+        api_key (str): API-ключ для доступа к NASA API.
+        intervals (dict, optional): Интервалы обновления {источник: часы}.
+            По умолчанию FETCH_INTERVALS_HOURS.
+        workers (int, optional): Количество потоков общего движка загрузки.
+        dedup (str, optional): Обработка дубликатов: 'skip', 'link' или 'off'.
+    """
+
+    def __init__(self, api_key: str, intervals: dict = None, workers: int = DEFAULT_WORKERS, dedup: str = "skip"):
+        self.api_key = api_key
+        self.intervals = dict(FETCH_INTERVALS_HOURS, **(intervals or {}))
+        self.engine = DownloadEngine(workers=workers, dedup=dedup)
+        self._stop = threading.Event()
+        self._thread = None
+        self._fetchers = {
+            "NASA APOD": lambda: fetch_nasa_apod_images.main(
+                api_key=self.api_key, save_dir=IMAGE_SOURCES["NASA APOD"], count=APOD_FETCH_COUNT,
+                engine=self.engine,
+            ),
+            "NASA EPIC": lambda: fetch_nasa_epic_images.main(
+                api_key=self.api_key, save_dir=IMAGE_SOURCES["NASA EPIC"], engine=self.engine,
+            ),
+            "SpaceX": lambda: fetch_spacex_images.main(
+                save_dir=IMAGE_SOURCES["SpaceX"], engine=self.engine,
+            ),
+        }
+
+    def run_once(self, source: str) -> bool:
+        """Обновляет изображения одного источника.
+
+        Args:
+            source (str): Источник, например 'NASA APOD'.
+
+        Returns:
+            bool: True, если обновление прошло без ошибок.
+        """
+        logger.info(f"Обновление источника {source}")
+        started = time.monotonic()
+        try:
+            self._fetchers[source]()
+        except (ValueError, requests.exceptions.RequestException, OSError) as e:
+            logger.error(f"Ошибка при обновлении источника {source}: {e}")
+            return False
+        except Exception:
+            # Неожиданная ошибка не должна останавливать обновление остальных источников
+            logger.exception(f"Непредвиденная ошибка при обновлении источника {source}")
+            return False
+        logger.info(f"Источник {source} обновлён за {time.monotonic() - started:.1f} с")
+        return True
+
+    def run(self) -> None:
+        """Обновляет источники по расписанию, пока не будет вызван stop()."""
+        next_runs = {
+            source: time.monotonic()
+            for source, hours in self.intervals.items()
+            if hours > 0 and source in self._fetchers
+        }
+        if not next_runs:
+            logger.warning("Ни для одного источника не задан интервал обновления")
+            return
+        while not self._stop.is_set():
+            source = min(next_runs, key=next_runs.get)
+            if self._stop.wait(max(0.0, next_runs[source] - time.monotonic())):
+                break
+            self.run_once(source)
+            next_runs[source] = time.monotonic() + self.intervals[source] * 3600
+
+    def start(self) -> threading.Thread:
+        """Запускает сервис в фоновом потоке.
+
+        Returns:
+            threading.Thread: Поток сервиса.
+        """
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name="fetch-service", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self, timeout: float = None) -> None:
+        """Останавливает сервис, дожидаясь текущего обновления и начатых загрузок.
+
+        Args:
+            timeout (float, optional): Сколько секунд ждать остановки потока.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.engine.close()
+
+
+def get_fetch_intervals() -> dict:
+    """Читает интервалы обновления источников из переменных окружения.
+
+    Returns:
+        dict: Интервалы {источник: часы}.
+
+    Raises:
+        ValueError: Если интервал не является числом.
+    """
+    settings = get_settings()
+    intervals = {}
+    for source, env_key in FETCH_INTERVAL_ENV.items():
+        value = settings.get_float(env_key)
+        if value is not None:
+            intervals[source] = value
+    return intervals
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Периодическое обновление изображений всех источников")
+    parser.add_argument(
+        "--api_key",
+        type=str,
+        help="API-ключ (если не указан — берётся из .env)"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help=f"Количество параллельных загрузок (по умолчанию {DEFAULT_WORKERS})"
+    )
+    args = parser.parse_args()
+
+    setup_logging()
+    metrics.configure_metrics()
+    service = FetchService(get_api_key("NASA_API_KEY", args.api_key), intervals=get_fetch_intervals(),
+                           workers=args.workers)
+    try:
+        service.run()
+    except KeyboardInterrupt:
+        logger.info("Сервис обновления остановлен")
+    finally:
+        service.stop()
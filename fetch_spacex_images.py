@@ -1,7 +1,20 @@
 import argparse
-import requests
-from utils import logger
-from image_utils import download_image
+import json
+import os
+import time
+import metrics
+from utils import lazy_import, logger, setup_logging
+from image_utils import (
+    DEFAULT_WORKERS, DownloadEngine, add_download_arguments, download_jobs,
+    http_get, http_post, plan_download,
+)
+
+requests = lazy_import("requests")
+
+SPACEX_API_URL = "https://api.spacexdata.com/v4"
+LAUNCH_INDEX_FILENAME = ".launch_index.json"  # Кэш списка запусков внутри save_dir
+LAUNCH_INDEX_TTL_HOURS = 24  # Сколько часов кэш списка запусков считается актуальным
+LAUNCH_QUERY_PAGE_SIZE = 200  # Количество запусков на странице ответа /launches/query
 
 def get_patch_urls(launch_info: dict) -> list:
     """Извлекает URL патчей из данных запуска SpaceX.
@@ -41,53 +54,158 @@ def get_image_urls(launch_info: dict, launch_id: str = None) -> tuple[list, str]
         logger.info(f"Используются патчи {'запуска ' + launch_id if launch_id else 'последнего запуска'}: {len(image_urls)}")
     return image_urls, prefix
 
+def fetch_launch_index() -> list:
+    """Получает список всех запусков SpaceX с фотографиями Flickr.
+
+    Использует постраничный запрос /launches/query, который возвращает только
+    нужные поля, вместо отдельного запроса на каждый запуск.
+
+    Returns:
+        list: Запуски (id, name, date_utc, links) от новых к старым.
+
+    Raises:
+        requests.exceptions.RequestException: Ошибки при выполнении HTTP-запроса.
+    """
+    launches = []
+    page = 1
+    while True:
+        body = {
+            "query": {"links.flickr.original.0": {"$exists": True}},
+            "options": {
+                "select": {"id": 1, "name": 1, "date_utc": 1, "links": 1},
+                "sort": {"date_utc": "desc"},
+                "limit": LAUNCH_QUERY_PAGE_SIZE,
+                "page": page,
+            },
+        }
+        response = http_post(f"{SPACEX_API_URL}/launches/query", json=body)
+        response.raise_for_status()
+        result = response.json()
+        launches.extend(result.get("docs", []))
+        if not result.get("hasNextPage"):
+            return launches
+        page += 1
+
+def load_launch_index(save_dir: str, ttl_hours: float = LAUNCH_INDEX_TTL_HOURS) -> list:
+    """Возвращает список запусков с фотографиями, используя локальный кэш.
+
+    Список запрашивается у API, только если кэша нет или он старше ttl_hours.
+
+    Args:
+        save_dir (str): Папка с изображениями, в которой хранится кэш.
+        ttl_hours (float, optional): Время жизни кэша в часах.
+
+    Returns:
+        list: Запуски от новых к старым.
+
+    Raises:
+        requests.exceptions.RequestException: Ошибки при выполнении HTTP-запроса.
+    """
+    path = os.path.join(save_dir, LAUNCH_INDEX_FILENAME)
+    try:
+        with open(path, encoding="utf-8") as f:
+            cached = json.load(f)
+        if time.time() - cached["fetched_at"] < ttl_hours * 3600:
+            logger.info(f"Используется кэш списка запусков: {len(cached['launches'])} запусков")
+            return cached["launches"]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    launches = fetch_launch_index()
+    os.makedirs(save_dir, exist_ok=True)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump({"fetched_at": time.time(), "launches": launches}, f)
+    os.replace(f"{path}.tmp", path)
+    logger.info(f"Получен список запусков с фотографиями: {len(launches)}")
+    return launches
+
+def harvest(save_dir: str = "spacex_images", max_launches: int = None,
+            ttl_hours: float = LAUNCH_INDEX_TTL_HOURS, workers: int = DEFAULT_WORKERS,
+            refresh: bool = False, dedup: str = "skip") -> None:
+    """Скачивает фотографии Flickr сразу многих запусков SpaceX одной пакетной загрузкой.
+
+    Args:
+        save_dir (str, optional): Папка для сохранения изображений. По умолчанию 'spacex_images'.
+        max_launches (int, optional): Сколько последних запусков обработать. По умолчанию все.
+        ttl_hours (float, optional): Время жизни кэша списка запусков в часах.
+        workers (int, optional): Количество параллельных загрузок.
+        refresh (bool, optional): Перепроверить уже скачанные изображения.
+        dedup (str, optional): Обработка дубликатов: 'skip', 'link' или 'off'. По умолчанию 'skip'.
+
+    Raises:
+        requests.exceptions.RequestException: Ошибки при получении списка запусков.
+    """
+    launches = load_launch_index(save_dir, ttl_hours)[:max_launches]
+    jobs = []
+    known = 0
+    for launch_info in launches:
+        for image_url in launch_info.get("links", {}).get("flickr", {}).get("original", []):
+            job = plan_download(image_url, save_dir, image_url, prefix=f"spacex_{launch_info['id']}",
+                                refresh=refresh)
+            if job:
+                jobs.append(job)
+            else:
+                known += 1
+    logger.info(f"Запусков: {len(launches)}, новых изображений: {len(jobs)}, уже скачанных: {known}")
+    with DownloadEngine(workers=workers, dedup=dedup) as engine:
+        engine.download_all(jobs)
+
+@metrics.timed("fetch_seconds", source="SpaceX")
 def main(launch_id: str = None, save_dir: str = "spacex_images",
-         url: str = "https://api.spacexdata.com/v4/launches/latest",
-         prefix: str = "spacex_latest") -> None:
+         url: str = None,
+         prefix: str = "spacex_latest", workers: int = DEFAULT_WORKERS,
+         refresh: bool = False, dedup: str = "skip", engine: DownloadEngine = None) -> None:
     """Получает фотографии запуска SpaceX по ID или последнего запуска и сохраняет их локально.
 
     Args:
         launch_id (str, optional): Идентификатор запуска SpaceX в формате API v4.
             Если None, загружается последний запуск.
         save_dir (str, optional): Папка для сохранения изображений. По умолчанию 'spacex_images'.
-        url (str, optional): URL для запроса к SpaceX API. По умолчанию для последнего запуска.
+        url (str, optional): URL для запроса к SpaceX API. По умолчанию для последнего запуска
+            (адрес строится из SPACEX_API_URL при вызове).
         prefix (str, optional): Префикс для имен файлов. По умолчанию 'spacex_latest'.
+        workers (int, optional): Количество параллельных загрузок.
+        refresh (bool, optional): Перепроверить уже скачанные изображения. По умолчанию они пропускаются.
+        dedup (str, optional): Обработка дубликатов: 'skip', 'link' или 'off'. По умолчанию 'skip'.
+        engine (DownloadEngine, optional): Общий движок загрузки. Если передан, workers и dedup не используются.
+
+    Если у запуска нет ни фотографий, ни патчей, используется самый свежий
+    запуск с фотографиями из кэша списка запусков.
 
     Raises:
         requests.exceptions.HTTPError: Ошибки при выполнения HTTP-запроса.
         requests.exceptions.RequestException: Другие ошибки запроса.
     """
     if launch_id:
-        url = f"https://api.spacexdata.com/v4/launches/{launch_id}"
+        url = f"{SPACEX_API_URL}/launches/{launch_id}"
         prefix = f"spacex_{launch_id}"
+    elif url is None:
+        url = f"{SPACEX_API_URL}/launches/latest"
 
-    response = requests.get(url, timeout=30)
+    response = http_get(url)
     response.raise_for_status()
     launch_info = response.json()
     logger.debug(f"Полный ответ API: {launch_info}")
     image_urls, prefix = get_image_urls(launch_info, launch_id)
 
     if not image_urls:
-        fallback_launch_id = "5eb87d47ffd86e000604b38a"
-        fallback_url = f"https://api.spacexdata.com/v4/launches/{fallback_launch_id}"
         try:
-            fallback_response = requests.get(fallback_url, timeout=30)
-            fallback_response.raise_for_status()
-            fallback_launch_info = fallback_response.json()
-            logger.debug(f"Полный ответ API для запасного запуска: {fallback_launch_info}")
-            image_urls, prefix = get_image_urls(fallback_launch_info, fallback_launch_id)
-            if not image_urls:
-                logger.warning(f"Фотографий и патчей для последнего и запасного запуска не найдено.")
-                return
+            launches = load_launch_index(save_dir)
         except requests.exceptions.RequestException as e:
-            logger.error(f"Ошибка при выполнении запроса к запасному запуску SpaceX API: {e}")
+            logger.error(f"Ошибка при получении списка запусков SpaceX API: {e}")
             return
+        if not launches:
+            logger.warning("Фотографий и патчей для последнего запуска не найдено, других запусков с фотографиями нет.")
+            return
+        fallback_launch_info = launches[0]
+        logger.info(f"Используется запасной запуск с фотографиями: {fallback_launch_info.get('name', fallback_launch_info['id'])}")
+        image_urls, prefix = get_image_urls(fallback_launch_info, fallback_launch_info["id"])
 
-    for i, image_url in enumerate(image_urls):
-        try:
-            download_image(image_url, save_dir, i, prefix=prefix, params=None)
-        except (ValueError, requests.exceptions.RequestException, OSError) as e:
-            logger.error(f"Ошибка при загрузке {image_url}: {e}")
+    jobs = [plan_download(image_url, save_dir, image_url, prefix=prefix, refresh=refresh) for image_url in image_urls]
+    jobs = [job for job in jobs if job]
+    if len(jobs) < len(image_urls):
+        logger.info(f"Пропущено уже скачанных изображений: {len(image_urls) - len(jobs)}")
+    download_jobs(jobs, engine, workers=workers, dedup=dedup)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Скачивание изображений запуска SpaceX")
@@ -103,10 +221,35 @@ if __name__ == "__main__":
         default="spacex_images",
         help="Папка для сохранения изображений (по умолчанию spacex_images)"
     )
+    parser.add_argument(
+        "--all_launches",
+        action="store_true",
+        help="Скачать фотографии всех запусков с фотографиями Flickr одной пакетной загрузкой"
+    )
+    parser.add_argument(
+        "--max_launches",
+        type=int,
+        default=None,
+        help="Вместе с --all_launches: сколько последних запусков обработать (по умолчанию все)"
+    )
+    parser.add_argument(
+        "--cache_ttl_hours",
+        type=float,
+        default=LAUNCH_INDEX_TTL_HOURS,
+        help=f"Сколько часов использовать кэш списка запусков (по умолчанию {LAUNCH_INDEX_TTL_HOURS})"
+    )
+    add_download_arguments(parser)
     args = parser.parse_args()
 
+    setup_logging()
+    metrics.configure_metrics()
     try:
-        main(launch_id=args.launch_id, save_dir=args.save_dir)
+        if args.all_launches:
+            harvest(save_dir=args.save_dir, max_launches=args.max_launches, ttl_hours=args.cache_ttl_hours,
+                    workers=args.workers, refresh=args.refresh, dedup=args.dedup)
+        else:
+            main(launch_id=args.launch_id, save_dir=args.save_dir, workers=args.workers, refresh=args.refresh,
+                 dedup=args.dedup)
     except requests.exceptions.RequestException as e:
         logger.error(f"Ошибка: {e}")
         raise
\ No newline at end of file
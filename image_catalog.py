@@ -0,0 +1,191 @@
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass
+import metrics
+from utils import logger
+
+
+IMAGE_SOURCES = {
+    "NASA APOD": "nasa_images",
+    "NASA EPIC": "nasa_epic_photos",
+    "SpaceX": "spacex_images",
+}  # Источник изображений -> папка, в которую его сохраняют скрипты загрузки
+VALID_EXTENSIONS = (".jpg", ".png")  # Расширения изображений, которые можно публиковать
+
+
+@dataclass(frozen=True)
+class CatalogImage:
+    """Изображение из каталога.
+
+    Attributes:
+        path (str): Путь к файлу.
+        source (str): Название источника, например 'NASA APOD'.
+    """
+    path: str
+    source: str
+
+
+class ImageCatalog:
+    """Каталог изображений, доступных для публикации, по источникам.
+
+    Папки сканируются один раз при создании каталога. Затем refresh()
+    проверяет только время изменения самих папок и пересканирует лишь те,
+    в которых что-то добавилось или удалилось. Выбор случайного изображения
+    и удаление изображения из каталога выполняются за O(1).
+
+    Args:
+        sources (dict, optional): Словарь {источник: папка}. По умолчанию IMAGE_SOURCES.
+        extensions (tuple, optional): Допустимые расширения файлов.
+    """
+
+    def __init__(self, sources: dict = None, extensions: tuple = VALID_EXTENSIONS):
+        self.sources = dict(sources or IMAGE_SOURCES)
+        self.extensions = extensions
+        self._images = {source: [] for source in self.sources}
+        self._positions = {source: {} for source in self.sources}
+        self._mtimes = {}
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def _scan(self, source: str, directory: str) -> None:
+        started = time.perf_counter()
+        images = []
+        seen_inodes = set()
+        total_bytes = 0
+        measure_size = metrics.enabled()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in sorted(entries, key=lambda item: item.name):
+                    if not entry.name.lower().endswith(self.extensions) or not entry.is_file():
+                        continue
+                    inode = entry.inode()
+                    if inode in seen_inodes:
+                        continue  # жёсткая ссылка на уже учтённый файл
+                    seen_inodes.add(inode)
+                    images.append(entry.path)
+                    if measure_size:
+                        total_bytes += entry.stat().st_size
+        except OSError as e:
+            logger.error(f"Ошибка при поиске изображений в {directory}: {e}")
+        self._images[source] = images
+        self._positions[source] = {path: position for position, path in enumerate(images)}
+        metrics.observe("catalog_scan_seconds", time.perf_counter() - started, source=source)
+        metrics.set_gauge("catalog_images", len(images), source=source)
+        if measure_size:
+            metrics.set_gauge("directory_bytes", total_bytes, source=source)
+        logger.info(f"Каталог {source}: {len(images)} изображений в {directory}")
+
+    def refresh(self) -> bool:
+        """Пересканирует папки, изменившиеся с прошлой проверки.
+
+        Returns:
+            bool: True, если хотя бы одна папка была пересканирована.
+        """
+        changed = False
+        with self._lock:
+            for source, directory in self.sources.items():
+                try:
+                    mtime = os.stat(directory).st_mtime_ns
+                except OSError:
+                    mtime = None
+                if source in self._mtimes and self._mtimes[source] == mtime:
+                    continue
+                self._mtimes[source] = mtime
+                if mtime is None:
+                    self._images[source] = []
+                    self._positions[source] = {}
+                else:
+                    self._scan(source, directory)
+                changed = True
+        return changed
+
+    def discard(self, path: str) -> None:
+        """Удаляет изображение из каталога, например если файл исчез.
+
+        Args:
+            path (str): Путь к файлу.
+        """
+        with self._lock:
+            for source, positions in self._positions.items():
+                position = positions.pop(path, None)
+                if position is None:
+                    continue
+                images = self._images[source]
+                last = images.pop()
+                if last != path:
+                    images[position] = last
+                    positions[last] = position
+                return
+
+    def count(self, source: str = None) -> int:
+        """Возвращает количество изображений в каталоге.
+
+        Args:
+            source (str, optional): Источник. По умолчанию — все источники.
+
+        Returns:
+            int: Количество изображений.
+        """
+        if source is not None:
+            return len(self._images.get(source, []))
+        return sum(len(images) for images in self._images.values())
+
+    def paths(self, source: str) -> list:
+        """Возвращает копию списка изображений источника.
+
+        Args:
+            source (str): Источник.
+
+        Returns:
+            list: Пути к изображениям.
+        """
+        with self._lock:
+            return list(self._images.get(source, []))
+
+    def source_of(self, path: str) -> str | None:
+        """Возвращает источник изображения из каталога.
+
+        Args:
+            path (str): Путь к файлу.
+
+        Returns:
+            str | None: Источник или None, если изображения нет в каталоге.
+        """
+        with self._lock:
+            for source, positions in self._positions.items():
+                if path in positions:
+                    return source
+        return None
+
+    def sample(self, source: str) -> str | None:
+        """Выбирает случайное изображение источника за O(1).
+
+        Args:
+            source (str): Источник.
+
+        Returns:
+            str | None: Путь к изображению или None, если у источника нет изображений.
+        """
+        with self._lock:
+            images = self._images.get(source)
+            return random.choice(images) if images else None
+
+    def random_image(self) -> CatalogImage:
+        """Выбирает случайный источник, в котором есть изображения, и случайное изображение из него.
+
+        Returns:
+            CatalogImage: Выбранное изображение.
+
+        Raises:
+            ValueError: Если ни одна папка не найдена или в них нет изображений.
+        """
+        with self._lock:
+            if all(mtime is None for mtime in self._mtimes.values()):
+                raise ValueError("Ни одна из указанных папок не найдена")
+            sources = [source for source, images in self._images.items() if images]
+            if not sources:
+                raise ValueError(f"В папках {list(self.sources.values())} нет изображений с расширениями {self.extensions}")
+            source = random.choice(sources)
+            return CatalogImage(random.choice(self._images[source]), source)
@@ -0,0 +1,160 @@
+import json
+import os
+import random
+import threading
+import time
+from collections import Counter, deque
+from image_catalog import CatalogImage, ImageCatalog
+from utils import logger
+
+
+POST_HISTORY_PATH = "post_history.json"  # Файл с историей публикаций
+RECENT_WINDOW = 50  # Сколько последних публикаций не повторять
+MAX_SAMPLE_ATTEMPTS = 20  # Попыток случайного выбора до перебора всех изображений источника
+
+
+class PostHistory:
+    """История публикаций, сохраняемая между перезапусками бота.
+
+    Хранит окно последних опубликованных изображений, которые не нужно
+    повторять, и время последней публикации каждого изображения.
+
+    Args:
+        path (str, optional): Путь к JSON-файлу истории.
+        window (int, optional): Размер окна последних публикаций.
+    """
+
+    def __init__(self, path: str = POST_HISTORY_PATH, window: int = RECENT_WINDOW):
+        self.path = path
+        self.recent = deque(maxlen=max(0, window))
+        self.last_posted = {}
+        self._recent_counts = Counter()
+        self._load()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Не удалось прочитать историю публикаций {self.path}: {e}")
+            return
+        self.last_posted = dict(data.get("last_posted", {}))
+        for path in data.get("recent", []):
+            self._append(path)
+
+    def _append(self, path: str) -> None:
+        if self.recent.maxlen == 0:
+            return
+        if len(self.recent) == self.recent.maxlen:
+            dropped = self.recent[0]
+            self._recent_counts[dropped] -= 1
+            if self._recent_counts[dropped] <= 0:
+                del self._recent_counts[dropped]
+        self.recent.append(path)
+        self._recent_counts[path] += 1
+
+    def __contains__(self, path: str) -> bool:
+        return path in self._recent_counts
+
+    def record(self, path: str, posted_at: float = None) -> None:
+        """Запоминает публикацию изображения и сохраняет историю на диск.
+
+        Args:
+            path (str): Путь к опубликованному изображению.
+            posted_at (float, optional): Время публикации (Unix time). По умолчанию текущее.
+        """
+        self._append(path)
+        self.last_posted[path] = posted_at if posted_at is not None else time.time()
+        self.save()
+
+    def save(self) -> None:
+        """Атомарно сохраняет историю в файл."""
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"recent": list(self.recent), "last_posted": self.last_posted}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error(f"Не удалось сохранить историю публикаций {self.path}: {e}")
+
+
+class ImageSelector:
+    """Выбор изображения для публикации с весами источников и без повторов.
+
+    Источник выбирается с вероятностью, пропорциональной его весу. Если веса
+    не заданы, вес источника равен числу его изображений, то есть каждое
+    изображение выбирается равновероятно. Изображения из окна последних
+    публикаций пропускаются; выбор выполняется случайными пробами, поэтому
+    в больших каталогах занимает O(1). Методы pick и record потокобезопасны,
+    поэтому один объект можно использовать для нескольких каналов.
+
+    Args:
+        catalog (ImageCatalog): Каталог изображений.
+        weights (dict, optional): Веса источников {источник: вес}. Источники
+            без веса получают вес 1, источники с весом 0 не публикуются.
+        history (PostHistory, optional): История публикаций.
+    """
+
+    def __init__(self, catalog: ImageCatalog, weights: dict = None, history: PostHistory = None):
+        self.catalog = catalog
+        self.weights = weights or None
+        self.history = history if history is not None else PostHistory()
+        self._lock = threading.Lock()
+
+    def _source_weight(self, source: str) -> float:
+        if self.weights is None:
+            return self.catalog.count(source)
+        return self.weights.get(source, 1.0) if self.catalog.count(source) else 0.0
+
+    def _pick_from(self, source: str) -> str | None:
+        for _ in range(MAX_SAMPLE_ATTEMPTS):
+            path = self.catalog.sample(source)
+            if path is None:
+                return None
+            if path not in self.history:
+                return path
+        candidates = [path for path in self.catalog.paths(source) if path not in self.history]
+        return random.choice(candidates) if candidates else None
+
+    def pick(self) -> CatalogImage:
+        """Выбирает изображение для следующей публикации.
+
+        Returns:
+            CatalogImage: Выбранное изображение.
+
+        Raises:
+            ValueError: Если в каталоге нет изображений с ненулевым весом.
+        """
+        with self._lock:
+            return self._pick_locked()
+
+    def _pick_locked(self) -> CatalogImage:
+        sources = {source: self._source_weight(source) for source in self.catalog.sources}
+        sources = {source: weight for source, weight in sources.items() if weight > 0}
+        if not sources:
+            raise ValueError("Нет изображений для публикации")
+
+        while sources:
+            source = random.choices(list(sources), weights=list(sources.values()))[0]
+            path = self._pick_from(source)
+            if path:
+                return CatalogImage(path, source)
+            del sources[source]
+
+        logger.warning("Все изображения публиковались недавно, выбрано самое давнее из них")
+        for path in self.history.recent:
+            source = self.catalog.source_of(path)
+            if source and self._source_weight(source) > 0:
+                return CatalogImage(path, source)
+        return self.catalog.random_image()
+
+    def record(self, image: CatalogImage) -> None:
+        """Запоминает опубликованное изображение.
+
+        Args:
+            image (CatalogImage): Опубликованное изображение.
+        """
+        with self._lock:
+            self.history.record(image.path)
@@ -1,39 +1,870 @@
+import hashlib
+import heapq
 import os
-import requests
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
 from urllib.parse import urlparse
-from dotenv import load_dotenv
-from utils import logger
+import metrics
+from dedup import DEDUP_MODES, IMAGE_EXTENSIONS, ContentStore, file_sha256, get_content_store, replace_with_link
+from image_catalog import IMAGE_SOURCES
+from image_validation import ImageValidator
+from image_selector import POST_HISTORY_PATH, PostHistory
+from manifest import DownloadManifest, get_manifest
+from settings import get_settings, parse_source_values
+from utils import lazy_import, logger
 
+requests = lazy_import("requests")
 
-def download_image(url: str, save_dir: str, index: int, prefix: str = "", params: dict = None) -> None:
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024  # Размер порции при потоковой загрузке (байт)
+MAX_IMAGE_BYTES = 50 * 1024 * 1024  # Максимальный размер одного изображения (байт)
+DEFAULT_WORKERS = 8  # Количество потоков загрузки по умолчанию
+DEFAULT_PER_HOST_LIMIT = 4  # Максимум одновременных загрузок с одного хоста
+HTTP_TIMEOUT = 30  # Таймаут HTTP-запросов (секунды)
+HTTP_RETRIES = 3  # Количество повторов при временных ошибках
+HTTP_BACKOFF = 1.0  # Базовая задержка экспоненциального повтора (секунды)
+HTTP_MAX_BACKOFF = 60.0  # Максимальная задержка между повторами (секунды)
+RETRY_STATUSES = (429, 500, 502, 503, 504)  # Коды ответа, при которых запрос повторяется
+NASA_API_RATE_PER_HOUR = 1000  # Часовая квота NASA API для личного ключа (для DEMO_KEY — 30)
+NASA_API_BURST = 40  # Сколько запросов к NASA API можно сделать подряд без ожидания
+EVICTION_POLICIES = ("age", "lru", "size")  # Политики удаления изображений при превышении бюджета диска
+
+
+class HostRateLimiter:
+    """Ограничитель частоты запросов к хостам по алгоритму token bucket.
+
+    Args:
+        limits (dict): Лимиты по хостам в виде {хост: (запросов_в_секунду, размер_пачки)}.
+    """
+
+    def __init__(self, limits: dict = None):
+        self.limits = dict(limits or {})
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, host: str) -> None:
+        """Блокирует поток, пока для хоста не освободится токен.
+
+        Args:
+            host (str): Имя хоста.
+        """
+        if host not in self.limits:
+            return
+        rate, burst = self.limits[host]
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                tokens, updated_at = self._buckets.get(host, (burst, now))
+                tokens = min(burst, tokens + (now - updated_at) * rate)
+                if tokens >= 1:
+                    self._buckets[host] = (tokens - 1, now)
+                    return
+                self._buckets[host] = (tokens, now)
+                wait = (1 - tokens) / rate
+            time.sleep(wait)
+
+
+class HttpClient:
+    """Общая HTTP-сессия с пулом соединений, повторами и ограничением частоты.
+
+    Соединения к api.nasa.gov, epic.gsfc.nasa.gov, live.staticflickr.com и
+    другим хостам переиспользуются (keep-alive). Ответы с кодами RETRY_STATUSES
+    и сетевые ошибки повторяются с экспоненциальной задержкой и случайным
+    разбросом; заголовок Retry-After имеет приоритет над расчётной задержкой.
+
+    Args:
+        pool_size (int, optional): Размер пула соединений на хост.
+        retries (int, optional): Количество повторов при временных ошибках.
+        backoff (float, optional): Базовая задержка повтора в секундах.
+        max_backoff (float, optional): Максимальная задержка повтора в секундах.
+        rate_limits (dict, optional): Лимиты частоты запросов по хостам,
+            см. HostRateLimiter.
+    """
+
+    def __init__(self, pool_size: int = DEFAULT_WORKERS, retries: int = HTTP_RETRIES,
+                 backoff: float = HTTP_BACKOFF, max_backoff: float = HTTP_MAX_BACKOFF,
+                 rate_limits: dict = None):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.rate_limiter = HostRateLimiter(rate_limits)
+        self.session = requests.Session()
+        self.pool_size = 0
+        self._lock = threading.Lock()
+        self.ensure_pool_size(pool_size)
+
+    def ensure_pool_size(self, pool_size: int) -> None:
+        """Увеличивает пул соединений, если он меньше требуемого.
+
+        Args:
+            pool_size (int): Требуемое количество соединений на хост.
+        """
+        with self._lock:
+            if pool_size <= self.pool_size:
+                return
+            adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            self.session.mount("https://", adapter)
+            self.session.mount("http://", adapter)
+            self.pool_size = pool_size
+
+    def _retry_delay(self, attempt: int, response=None) -> float:
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                return max(0.0, float(retry_after))
+            except ValueError:
+                try:
+                    return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+                except (TypeError, ValueError):
+                    pass
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def request(self, method: str, url: str, **kwargs) -> "requests.Response":
+        """Выполняет HTTP-запрос с повторами при временных ошибках.
+
+        Args:
+            method (str): HTTP-метод.
+            url (str): URL запроса.
+            **kwargs: Параметры requests.Session.request.
+
+        Returns:
+            requests.Response: Ответ сервера (последний, если повторы исчерпаны).
+
+        Raises:
+            requests.exceptions.RequestException: Если сетевая ошибка повторилась после всех попыток.
+        """
+        kwargs.setdefault("timeout", HTTP_TIMEOUT)
+        host = urlparse(url).netloc
+        for attempt in range(self.retries + 1):
+            self.rate_limiter.acquire(host)
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                metrics.observe("http_request_seconds", time.perf_counter() - started,
+                                host=host, method=method, status="error")
+                if attempt == self.retries:
+                    raise
+                delay = self._retry_delay(attempt)
+                logger.warning(f"Сетевая ошибка при запросе {url}: {e}. Повтор через {delay:.1f} с")
+            else:
+                metrics.observe("http_request_seconds", time.perf_counter() - started,
+                                host=host, method=method, status=response.status_code)
+                if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                    return response
+                delay = self._retry_delay(attempt, response)
+                response.close()
+                logger.warning(f"Ответ {response.status_code} от {host}. Повтор через {delay:.1f} с")
+            metrics.inc("http_retries_total", host=host)
+            time.sleep(delay)
+
+    def get(self, url: str, **kwargs) -> "requests.Response":
+        """Выполняет GET-запрос, см. HttpClient.request."""
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> "requests.Response":
+        """Выполняет POST-запрос, см. HttpClient.request.
+
+        Повторяется так же, как GET, поэтому подходит только для
+        идемпотентных запросов, например поисковых.
+        """
+        return self.request("POST", url, **kwargs)
+
+
+_http_client = None
+_http_client_lock = threading.RLock()
+
+
+def configure_http(**kwargs) -> HttpClient:
+    """Создаёт общий HTTP-клиент с заданными настройками.
+
+    Args:
+        **kwargs: Параметры HttpClient. Если rate_limits не указаны, для
+            api.nasa.gov используется квота NASA_API_RATE_PER_HOUR
+            (переменная окружения с тем же именем переопределяет значение),
+            а запросов подряд допускается не больше NASA_API_BURST и не больше квоты.
+
+    Returns:
+        HttpClient: Новый общий HTTP-клиент.
+    """
+    global _http_client
+    if kwargs.get("rate_limits") is None:
+        rate_per_hour = get_settings().get_float("NASA_API_RATE_PER_HOUR", NASA_API_RATE_PER_HOUR)
+        burst = max(1, min(NASA_API_BURST, int(rate_per_hour)))  # запас не больше часовой квоты
+        kwargs["rate_limits"] = {"api.nasa.gov": (rate_per_hour / 3600, burst)}
+    with _http_client_lock:
+        _http_client = HttpClient(**kwargs)
+    return _http_client
+
+
+def get_http_client() -> HttpClient:
+    """Возвращает общий HTTP-клиент, создавая его при первом обращении.
+
+    Returns:
+        HttpClient: Общий HTTP-клиент.
+    """
+    if _http_client is None:
+        with _http_client_lock:
+            if _http_client is None:
+                configure_http()
+    return _http_client
+
+
+def http_get(url: str, **kwargs) -> "requests.Response":
+    """Выполняет GET-запрос через общий HTTP-клиент.
+
+    Args:
+        url (str): URL запроса.
+        **kwargs: Параметры requests.Session.request.
+
+    Returns:
+        requests.Response: Ответ сервера.
+    """
+    return get_http_client().get(url, **kwargs)
+
+
+def http_post(url: str, **kwargs) -> "requests.Response":
+    """Выполняет POST-запрос через общий HTTP-клиент.
+
+    Args:
+        url (str): URL запроса.
+        **kwargs: Параметры requests.Session.request.
+
+    Returns:
+        requests.Response: Ответ сервера.
+    """
+    return get_http_client().post(url, **kwargs)
+
+
+class StorageManager:
+    """Ограничивает место на диске, занимаемое папками с изображениями.
+
+    Для каждой папки и для всех папок вместе можно задать бюджет в байтах.
+    Если после сохранения нового файла бюджет превышен, удаляются изображения
+    по выбранной политике:
+
+    - 'age' — сначала самые старые файлы (по времени изменения);
+    - 'lru' — сначала те, что дольше всего не публиковались ботом
+      (по истории публикаций; для ещё не опубликованных файлов
+      учитывается время скачивания);
+    - 'size' — сначала самые большие файлы.
+
+    Каждая папка сканируется один раз при первом обращении, дальше индекс
+    обновляется по мере скачивания (track), поэтому проверка бюджета
+    не требует повторного обхода папок. Жёсткие ссылки одного файла
+    учитываются в занятом месте один раз.
+
+    Args:
+        budgets (dict, optional): Бюджеты папок {папка: байты}.
+        total_budget (int, optional): Общий бюджет всех папок в байтах. None — без ограничения.
+        policy (str, optional): Политика удаления: 'age', 'lru' или 'size'. По умолчанию 'lru'.
+        directories (list, optional): Папки, которые учитываются в общем бюджете.
+            По умолчанию папки IMAGE_SOURCES.
+        history_path (str, optional): Файл истории публикаций бота для политики 'lru'.
+    """
+
+    def __init__(self, budgets: dict = None, total_budget: int = None, policy: str = "lru",
+                 directories: list = None, history_path: str = POST_HISTORY_PATH):
+        if policy not in EVICTION_POLICIES:
+            raise ValueError(f"Неизвестная политика удаления: {policy}")
+        self.budgets = {os.path.abspath(directory): budget for directory, budget in (budgets or {}).items()}
+        self.total_budget = total_budget
+        self.policy = policy
+        self.directories = {os.path.abspath(directory)
+                            for directory in (directories or IMAGE_SOURCES.values())} | set(self.budgets)
+        self.history_path = history_path
+        self._files = {}
+        self._links = {}
+        self._charged = {}
+        self._usage = Counter()
+        self._total = 0
+        self._heaps = {}
+        self._scanned = set()
+        self._last_posted = {}
+        self._history_mtime = None
+        self._lock = threading.Lock()
+
+    def _sort_key(self, path: str, size: int, mtime: float) -> float:
+        if self.policy == "size":
+            return -size
+        if self.policy == "lru":
+            return self._last_posted.get(path, mtime)
+        return mtime
+
+    def _reload_history_locked(self) -> None:
+        try:
+            mtime = os.stat(self.history_path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime == self._history_mtime:
+            return
+        self._history_mtime = mtime
+        history = PostHistory(self.history_path, window=0) if mtime is not None else None
+        self._last_posted = {
+            os.path.abspath(path): posted_at for path, posted_at in (history.last_posted if history else {}).items()
+        }
+        for directory, heap in self._heaps.items():
+            heap[:] = [
+                (self._sort_key(path, size, mtime), path)
+                for path, (file_dir, size, mtime, _) in self._files.items() if file_dir == directory
+            ]
+            heapq.heapify(heap)
+
+    def _scan_locked(self, directory: str) -> None:
+        self._scanned.add(directory)
+        self._heaps.setdefault(directory, [])
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name.lower().endswith(IMAGE_EXTENSIONS) and entry.is_file():
+                        self._add_locked(entry.path, entry.stat())
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"Ошибка при подсчёте места в {directory}: {e}")
+
+    def _add_locked(self, path: str, stat: os.stat_result) -> None:
+        if path in self._files:
+            self._remove_locked(path)
+        directory = os.path.dirname(path)
+        inode = (stat.st_dev, stat.st_ino)
+        self._files[path] = (directory, stat.st_size, stat.st_mtime, inode)
+        links = self._links.setdefault(inode, set())
+        links.add(path)
+        if len(links) == 1:
+            self._charged[inode] = directory
+            self._usage[directory] += stat.st_size
+            self._total += stat.st_size
+        heapq.heappush(self._heaps.setdefault(directory, []),
+                       (self._sort_key(path, stat.st_size, stat.st_mtime), path))
+
+    def _remove_locked(self, path: str) -> None:
+        directory, size, _, inode = self._files.pop(path)
+        links = self._links[inode]
+        links.discard(path)
+        charged = self._charged[inode]
+        if not links:
+            del self._links[inode], self._charged[inode]
+            self._usage[charged] -= size
+            self._total -= size
+        elif charged == directory and all(os.path.dirname(link) != directory for link in links):
+            new_charged = os.path.dirname(next(iter(links)))
+            self._charged[inode] = new_charged
+            self._usage[directory] -= size
+            self._usage[new_charged] += size
+
+    def _candidate_locked(self, directory: str, protected: set) -> tuple | None:
+        heap = self._heaps.get(directory, [])
+        while heap:
+            sort_key, path = heap[0]
+            info = self._files.get(path)
+            if info is None or self._sort_key(path, info[1], info[2]) != sort_key:
+                heapq.heappop(heap)  # файл удалён или перезаписан, запись устарела
+                continue
+            if path in protected:
+                heapq.heappop(heap)
+                candidate = self._candidate_locked(directory, protected)
+                heapq.heappush(heap, (sort_key, path))
+                return candidate
+            return sort_key, path
+        return None
+
+    def _evict_locked(self, path: str) -> None:
+        size = self._files[path][1]
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"Не удалось удалить {path}: {e}")
+        self._remove_locked(path)
+        logger.info(f"Удалено для освобождения места ({self.policy}): {path} ({size} байт)")
+
+    def _enforce_locked(self, protected: set) -> list:
+        if self.policy == "lru":
+            self._reload_history_locked()
+        evicted = []
+        for directory, budget in self.budgets.items():
+            while self._usage[directory] > budget:
+                candidate = self._candidate_locked(directory, protected)
+                if candidate is None:
+                    break
+                self._evict_locked(candidate[1])
+                evicted.append(candidate[1])
+        while self.total_budget is not None and self._total > self.total_budget:
+            candidates = filter(None, (self._candidate_locked(directory, protected) for directory in self._heaps))
+            candidate = min(candidates, default=None)
+            if candidate is None:
+                break
+            self._evict_locked(candidate[1])
+            evicted.append(candidate[1])
+        return evicted
+
+    def _ensure_scanned_locked(self, extra_directory: str = None) -> None:
+        for directory in self.directories | ({extra_directory} if extra_directory else set()):
+            if directory not in self._scanned:
+                self._scan_locked(directory)
+
+    def track(self, path: str) -> list:
+        """Учитывает новый файл и освобождает место, если бюджет превышен.
+
+        Сам файл path при этом не удаляется.
+
+        Args:
+            path (str): Путь к только что сохранённому изображению.
+
+        Returns:
+            list: Пути удалённых изображений.
+        """
+        path = os.path.abspath(path)
+        with self._lock:
+            self._ensure_scanned_locked(os.path.dirname(path))
+            try:
+                self._add_locked(path, os.stat(path))
+            except FileNotFoundError:
+                return []
+            return self._enforce_locked({path})
+
+    def enforce(self) -> list:
+        """Проверяет бюджеты всех папок и удаляет лишние изображения.
+
+        Returns:
+            list: Пути удалённых изображений.
+        """
+        with self._lock:
+            self._ensure_scanned_locked()
+            return self._enforce_locked(set())
+
+    def usage(self, directory: str = None) -> int:
+        """Возвращает занятое изображениями место.
+
+        Args:
+            directory (str, optional): Папка. По умолчанию — все учтённые папки.
+
+        Returns:
+            int: Занятое место в байтах.
+        """
+        with self._lock:
+            self._ensure_scanned_locked(os.path.abspath(directory) if directory else None)
+            return self._usage[os.path.abspath(directory)] if directory else self._total
+
+
+_storage_manager = None
+_storage_manager_lock = threading.Lock()
+
+
+def get_storage_manager() -> StorageManager | None:
+    """Возвращает общий менеджер места на диске, настроенный переменными окружения.
+
+    STORAGE_BUDGET_MB задаёт общий бюджет всех папок, STORAGE_SOURCE_BUDGETS_MB —
+    бюджеты источников (например, 'NASA APOD=2000,SpaceX=500'), STORAGE_EVICTION —
+    политику удаления ('age', 'lru' или 'size'). История публикаций берётся
+    из TG_POST_HISTORY_FILE, как у бота.
+
+    Returns:
+        StorageManager | None: Менеджер или None, если ни один бюджет не задан.
+
+    Raises:
+        ValueError: Если бюджеты или политика заданы неверно.
+    """
+    global _storage_manager
+    with _storage_manager_lock:
+        if _storage_manager is not None:
+            return _storage_manager
+        settings = get_settings()
+        source_budgets = parse_source_values(settings.get("STORAGE_SOURCE_BUDGETS_MB", ""),
+                                             "STORAGE_SOURCE_BUDGETS_MB")
+        unknown = set(source_budgets) - set(IMAGE_SOURCES)
+        if unknown:
+            raise ValueError(f"Неизвестные источники в STORAGE_SOURCE_BUDGETS_MB: {', '.join(sorted(unknown))}")
+        total_budget = settings.get_float("STORAGE_BUDGET_MB")
+        if not source_budgets and total_budget is None:
+            return None
+        _storage_manager = StorageManager(
+            budgets={IMAGE_SOURCES[source]: int(mb * 1024 * 1024) for source, mb in source_budgets.items()},
+            total_budget=int(total_budget * 1024 * 1024) if total_budget is not None else None,
+            policy=settings.get("STORAGE_EVICTION", "lru"),
+            history_path=settings.get("TG_POST_HISTORY_FILE", POST_HISTORY_PATH),
+        )
+        return _storage_manager
+
+
+def download_image(url: str, save_dir: str, index: int, prefix: str = "", params: dict = None,
+                   chunk_size: int = DOWNLOAD_CHUNK_SIZE, max_bytes: int = MAX_IMAGE_BYTES,
+                   manifest: DownloadManifest = None, key: str = None,
+                   content_store: ContentStore = None, dedup_mode: str = "skip",
+                   storage: StorageManager = None, validator: ImageValidator = None) -> str:
     """Скачивает изображение по URL и сохраняет его в указанную папку.
 
+    Ответ читается потоково порциями по chunk_size байт во временный файл
+    с суффиксом .part, который после успешной загрузки атомарно
+    переименовывается в итоговый. Поэтому расход памяти не зависит от
+    размера изображения, а в папке никогда не появляются недокачанные файлы.
+
+    Если передан манифест, загрузка записывается в него по ключу key.
+    Для уже известного ключа используется прежнее имя файла и отправляется
+    условный запрос (If-None-Match / If-Modified-Since), а оставшийся после
+    обрыва .part-файл докачивается запросом с заголовком Range.
+
+    Если передан индекс содержимого, до переименования .part-файла
+    проверяется, не скачано ли это изображение раньше. Дубликат не
+    сохраняется (dedup_mode='skip') или сохраняется жёсткой ссылкой
+    на оригинал (dedup_mode='link').
+
+    Если передан валидатор, до переименования .part-файла в пуле процессов
+    проверяется, что это действительно изображение JPEG или PNG, которое
+    декодируется, из него удаляются лишние метаданные, а расширение файла
+    исправляется по настоящему формату. Файл, не прошедший проверку,
+    удаляется, и в папке он не появляется.
+
+    Если передан менеджер места на диске, сохранённый файл учитывается
+    в бюджете папки, и при его превышении удаляются старые изображения.
+
     Args:
         url (str): URL изображения.
         save_dir (str): Папка для сохранения.
         index (int): Индекс для имени файла.
         prefix (str, optional): Префикс для имени файла.
         params (dict, optional): GET-параметры для запроса.
+        chunk_size (int, optional): Размер порции при чтении ответа в байтах.
+        max_bytes (int, optional): Максимальный допустимый размер файла в байтах.
+            None — без ограничения.
+        manifest (DownloadManifest, optional): Манифест папки save_dir.
+        key (str, optional): Ключ изображения в манифесте.
+        content_store (ContentStore, optional): Индекс содержимого для поиска дубликатов.
+        dedup_mode (str, optional): 'skip' или 'link', см. выше.
+        storage (StorageManager, optional): Менеджер места на диске.
+        validator (ImageValidator, optional): Пул проверки изображений.
+
+    Returns:
+        str: Путь к сохранённому файлу (для пропущенного дубликата — путь к оригиналу).
 
     Raises:
-        ValueError: Если URL пустой или недоступен.
+        ValueError: Если URL пустой, файл превышает max_bytes или не прошёл проверку.
         requests.exceptions.RequestException: Ошибки при загрузке.
         OSError: Ошибки при сохранении файла.
     """
     if not url:
         raise ValueError("URL изображения пустой")
 
-    response = requests.get(url, params=params, timeout=30)
-    response.raise_for_status()
-
+    entry = manifest.get(key) if manifest is not None and key else None
     os.makedirs(save_dir, exist_ok=True)
-    extension = os.path.splitext(urlparse(url).path)[1] or ".jpg"
-    filename = f"{prefix}_{index:03d}{extension}" if prefix else f"image_{index:03d}{extension}"
+    if entry and entry.get("filename"):
+        filename = entry["filename"]
+    else:
+        extension = os.path.splitext(urlparse(url).path)[1] or ".jpg"
+        filename = f"{prefix}_{index:03d}{extension}" if prefix else f"image_{index:03d}{extension}"
+        if manifest is not None and key:
+            manifest.record(key, url=url, filename=filename, index=index)
     filepath = os.path.join(save_dir, filename)
+    part_path = f"{filepath}.part"
+
+    headers = {}
+    if entry and os.path.exists(filepath):
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    if offset:
+        headers["Range"] = f"bytes={offset}-"
+
+    response = http_get(url, params=params, headers=headers, stream=True)
+    if response.status_code == 416 and offset:
+        response.close()
+        os.remove(part_path)
+        offset = 0
+        del headers["Range"]
+        response = http_get(url, params=params, headers=headers, stream=True)
+
+    with response:
+        if response.status_code == 304:
+            logger.info(f"Изображение не изменилось: {filepath}")
+            return filepath
+        response.raise_for_status()
+
+        content_range = response.headers.get("Content-Range", "")
+        if offset and not (response.status_code == 206 and content_range.startswith(f"bytes {offset}-")):
+            offset = 0
+        content_length = response.headers.get("Content-Length")
+        if max_bytes is not None and content_length and offset + int(content_length) > max_bytes:
+            raise ValueError(f"Изображение {url} слишком большое: {content_length} байт (максимум {max_bytes})")
+
+        digest = hashlib.sha256()
+        if offset:
+            logger.info(f"Продолжение загрузки {filepath} с {offset} байт")
+            with open(part_path, "rb") as f:
+                for block in iter(lambda: f.read(chunk_size), b""):
+                    digest.update(block)
+
+        downloaded = offset
+        try:
+            with open(part_path, "ab" if offset else "wb") as f:
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    downloaded += len(chunk)
+                    if max_bytes is not None and downloaded > max_bytes:
+                        raise ValueError(f"Изображение {url} превышает допустимый размер {max_bytes} байт")
+                    digest.update(chunk)
+                    f.write(chunk)
+        except requests.exceptions.RequestException:
+            raise  # .part-файл остаётся для докачки при следующем запуске
+        except BaseException:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            raise
+
+        sha256 = digest.hexdigest()
+        size = downloaded
+        image_info = None
+        if validator is not None:
+            try:
+                image_info = validator.validate(part_path)
+            except ValueError as e:
+                os.remove(part_path)
+                raise ValueError(f"Изображение {url} не прошло проверку: {e}")
+            if not filename.lower().endswith(image_info.extension):
+                filename = f"{os.path.splitext(filename)[0]}{image_info.extension}"
+                filepath = os.path.join(save_dir, filename)
+            if image_info.rewritten:
+                sha256 = file_sha256(part_path)  # хэш и размер должны описывать файл на диске
+                size = os.path.getsize(part_path)
+        duplicate = content_store.claim(filepath, sha256, part_path) if content_store is not None else None
+        if duplicate and dedup_mode == "link":
+            try:
+                replace_with_link(duplicate, part_path)
+            except OSError as e:
+                logger.warning(f"Не удалось создать ссылку на {duplicate}: {e}")
+                dedup_mode = "skip"
+        if duplicate and dedup_mode != "link":
+            os.remove(part_path)
+        else:
+            os.replace(part_path, filepath)
+            if storage is not None:
+                storage.track(filepath)
+
+    if manifest is not None and key:
+        manifest.record(
+            key,
+            url=url,
+            filename=None if duplicate and dedup_mode != "link" else filename,
+            size=size,
+            sha256=sha256,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+            duplicate_of=duplicate,
+            format=image_info.format if image_info else None,
+            width=image_info.width if image_info else None,
+            height=image_info.height if image_info else None,
+        )
+    metrics.observe("download_bytes", downloaded - offset, buckets=metrics.SIZE_BUCKETS,
+                    source=metrics.source_label(save_dir))
+    if duplicate and dedup_mode != "link":
+        logger.info(f"Пропущен дубликат {url}, оригинал: {duplicate}")
+        return duplicate
+    if duplicate:
+        logger.info(f"Дубликат {url} сохранён ссылкой {filepath} -> {duplicate}")
+    else:
+        logger.info(f"Изображение сохранено: {filepath} ({size} байт)")
+    return filepath
+
+
+@dataclass
+class DownloadJob:
+    """Задание на загрузку одного изображения.
+
+    Attributes:
+        url (str): URL изображения.
+        save_dir (str): Папка для сохранения.
+        index (int): Индекс для имени файла.
+        prefix (str): Префикс для имени файла.
+        params (dict): GET-параметры для запроса.
+        key (str): Ключ изображения в манифесте папки. None — без манифеста.
+    """
+    url: str
+    save_dir: str
+    index: int
+    prefix: str = ""
+    params: dict = None
+    key: str = None
+
+
+def plan_download(url: str, save_dir: str, key: str, prefix: str, params: dict = None,
+                  refresh: bool = False) -> DownloadJob | None:
+    """Создаёт задание на загрузку с учётом манифеста папки.
 
-    with open(filepath, "wb") as f:
-        f.write(response.content)
-    logger.info(f"Изображение сохранено: {filepath}")
+    Полностью скачанные ранее изображения пропускаются. Для известного,
+    но недокачанного изображения сохраняется прежний индекс, для нового
+    выделяется следующий свободный индекс.
+
+    Args:
+        url (str): URL изображения.
+        save_dir (str): Папка для сохранения.
+        key (str): Ключ изображения в манифесте (URL, дата APOD, id снимка EPIC).
+        prefix (str): Префикс для имени файла.
+        params (dict, optional): GET-параметры для запроса.
+        refresh (bool, optional): Перепроверить уже скачанное изображение условным запросом.
+
+    Returns:
+        DownloadJob | None: Задание или None, если изображение уже скачано.
+    """
+    manifest = get_manifest(save_dir)
+    entry = manifest.get(key)
+    if entry and entry.get("sha256") and not refresh:
+        return None
+    index = entry["index"] if entry and "index" in entry else manifest.reserve_index(prefix)
+    return DownloadJob(url, save_dir, index, prefix=prefix, params=params, key=key)
+
+
+class DownloadEngine:
+    """Пул потоков для параллельной загрузки изображений.
+
+    Общий для всех скриптов загрузки. Количество одновременных запросов
+    к одному хосту ограничивается семафором, а имена файлов определяются
+    индексом задания, поэтому результат не зависит от порядка завершения загрузок.
+
+    Args:
+        workers (int, optional): Количество потоков загрузки.
+        per_host_limit (int, optional): Максимум одновременных загрузок с одного хоста.
+        dedup (str, optional): Обработка дубликатов: 'skip', 'link' или 'off', см. download_image.
+        storage (StorageManager, optional): Менеджер места на диске. По умолчанию общий,
+            если бюджет задан переменными окружения (см. get_storage_manager).
+        validate (bool, optional): Проверять скачанные изображения в пуле процессов. По умолчанию True.
+    """
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, per_host_limit: int = DEFAULT_PER_HOST_LIMIT,
+                 dedup: str = "skip", storage: StorageManager = None, validate: bool = True):
+        if workers < 1:
+            raise ValueError("Количество потоков загрузки должно быть больше нуля")
+        if dedup not in DEDUP_MODES:
+            raise ValueError(f"Неизвестный режим удаления дубликатов: {dedup}")
+        self.workers = workers
+        self.per_host_limit = max(1, per_host_limit)
+        self.dedup = dedup
+        self.content_store = get_content_store() if dedup != "off" else None
+        self.storage = storage if storage is not None else get_storage_manager()
+        self.validator = ImageValidator() if validate else None
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="download")
+        get_http_client().ensure_pool_size(workers)
+        self._host_semaphores = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self) -> None:
+        """Дожидается завершения загрузок и останавливает потоки и процессы проверки."""
+        self._executor.shutdown(wait=True)
+        if self.validator is not None:
+            self.validator.close()
+
+    def _host_semaphore(self, url: str) -> threading.BoundedSemaphore:
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._host_semaphores:
+                self._host_semaphores[host] = threading.BoundedSemaphore(self.per_host_limit)
+            return self._host_semaphores[host]
+
+    def _run_job(self, job: DownloadJob) -> str | None:
+        try:
+            with self._host_semaphore(job.url), \
+                    metrics.timer("download_seconds", source=metrics.source_label(job.save_dir)):
+                manifest = get_manifest(job.save_dir) if job.key else None
+                return download_image(job.url, job.save_dir, job.index, prefix=job.prefix, params=job.params,
+                                      manifest=manifest, key=job.key, content_store=self.content_store,
+                                      dedup_mode=self.dedup, storage=self.storage,
+                                      validator=self.validator)
+        except (ValueError, requests.exceptions.RequestException, OSError) as e:
+            logger.error(f"Ошибка при загрузке {job.url or 'без URL'}: {e}")
+            return None
+
+    def submit(self, job: DownloadJob):
+        """Ставит задание в очередь загрузки.
+
+        Args:
+            job (DownloadJob): Задание на загрузку.
+
+        Returns:
+            concurrent.futures.Future: Future с путём к файлу или None при ошибке.
+        """
+        return self._executor.submit(self._run_job, job)
+
+    def download_all(self, jobs: list) -> list:
+        """Скачивает все задания параллельно.
+
+        Задания с одинаковым ключом манифеста в одной папке (например, одна
+        фотография Flickr у двух запусков SpaceX) скачиваются один раз:
+        иначе два потока писали бы в один и тот же .part-файл.
+
+        Args:
+            jobs (list): Список заданий DownloadJob.
+
+        Returns:
+            list: Пути к сохранённым файлам в порядке заданий (None для неудачных загрузок).
+        """
+        planned = {}
+        futures = []
+        for job in jobs:
+            job_key = (os.path.abspath(job.save_dir), job.key) if job.key else None
+            if job_key is None:
+                futures.append(self.submit(job))
+            else:
+                if job_key not in planned:
+                    planned[job_key] = self.submit(job)
+                futures.append(planned[job_key])
+        return [future.result() for future in futures]
+
+
+def download_jobs(jobs: list, engine: DownloadEngine = None, workers: int = DEFAULT_WORKERS,
+                  dedup: str = "skip") -> list:
+    """Скачивает задания через переданный движок или через новый временный.
+
+    Args:
+        jobs (list): Список заданий DownloadJob.
+        engine (DownloadEngine, optional): Общий движок загрузки, например сервиса обновления.
+            Если не передан, создаётся временный с параметрами workers и dedup.
+        workers (int, optional): Количество потоков временного движка.
+        dedup (str, optional): Обработка дубликатов временным движком.
+
+    Returns:
+        list: Пути к сохранённым файлам в порядке заданий (None для неудачных загрузок).
+    """
+    if engine is not None:
+        return engine.download_all(jobs)
+    with DownloadEngine(workers=workers, dedup=dedup) as engine:
+        return engine.download_all(jobs)
+
+
+def add_download_arguments(parser) -> None:
+    """Добавляет в парсер аргументов общие флаги загрузки --workers, --refresh и --dedup.
+
+    Args:
+        parser (argparse.ArgumentParser): Парсер аргументов командной строки.
+    """
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help=f"Количество параллельных загрузок (по умолчанию {DEFAULT_WORKERS})"
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Перепроверить уже скачанные изображения условными запросами"
+    )
+    parser.add_argument(
+        "--dedup",
+        choices=DEDUP_MODES,
+        default="skip",
+        help="Дубликаты: skip — не сохранять, link — жёсткая ссылка на оригинал, off — не проверять (по умолчанию skip)"
+    )
 
 
 def get_api_key(env_key: str, cli_key: str = None) -> str:
@@ -49,8 +880,7 @@ def get_api_key(env_key: str, cli_key: str = None) -> str:
     Raises:
         ValueError: Если ключ не найден.
     """
-    load_dotenv()
-    api_key = cli_key or os.getenv(env_key)
+    api_key = cli_key or get_settings().get(env_key)
     if not api_key:
         raise ValueError(f"API-ключ {env_key} не найден")
-    return api_key
\ No newline at end of file
+    return api_key
@@ -0,0 +1,416 @@
+import argparse
+import os
+import struct
+import threading
+import zlib
+from concurrent.futures import BrokenExecutor
+from dataclasses import dataclass
+from dedup import file_sha256, get_content_store
+from image_catalog import IMAGE_SOURCES
+from manifest import get_manifest
+from utils import lazy_import, logger, setup_logging
+
+Image = lazy_import("PIL.Image")  # None, если Pillow не установлен
+
+
+FORMAT_EXTENSIONS = {"JPEG": ".jpg", "PNG": ".png"}  # Форматы, которые можно публиковать, и их расширения
+CONVERTIBLE_FORMATS = ("GIF", "WEBP")  # Форматы, которые с Pillow преобразуются в PNG
+JPEG_STRIP_MARKERS = (0xED, 0xFE)  # APP13 (Photoshop) и комментарии JPEG, которые удаляются
+JPEG_XMP_PREFIXES = (
+    b"http://ns.adobe.com/xap/1.0/\x00",
+    b"http://ns.adobe.com/xmp/extension/\x00",
+)  # Сегменты APP1 с XMP, которые удаляются (EXIF сохраняется ради ориентации снимка)
+PNG_STRIP_CHUNKS = (b"tEXt", b"zTXt", b"iTXt", b"tIME")  # Текстовые и служебные блоки PNG, которые удаляются (eXIf сохраняется)
+VALIDATION_WORKERS = min(4, os.cpu_count() or 1)  # Количество процессов проверки изображений
+COPY_CHUNK_SIZE = 1024 * 1024  # Размер порции при перезаписи файла (байт)
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+_JPEG_SOF_MARKERS = {marker for marker in range(0xC0, 0xD0)} - {0xC4, 0xC8, 0xCC}
+
+
+@dataclass(frozen=True)
+class ImageInfo:
+    """Результат проверки изображения.
+
+    Attributes:
+        format (str): Формат изображения: 'JPEG' или 'PNG'.
+        extension (str): Расширение файла для формата.
+        width (int): Ширина в пикселях.
+        height (int): Высота в пикселях.
+        stripped_bytes (int): Сколько байт метаданных удалено (или на сколько уменьшился файл при преобразовании).
+        rewritten (bool): Файл изменён на месте, и его SHA-256 и размер нужно посчитать заново.
+    """
+    format: str
+    extension: str
+    width: int
+    height: int
+    stripped_bytes: int = 0
+    rewritten: bool = False
+
+
+def sniff_format(path: str) -> str | None:
+    """Определяет формат изображения по первым байтам файла.
+
+    Args:
+        path (str): Путь к файлу.
+
+    Returns:
+        str | None: 'JPEG', 'PNG', 'GIF', 'WEBP' или None, если формат не распознан.
+
+    Raises:
+        OSError: Если файл не удалось прочитать.
+    """
+    with open(path, "rb") as f:
+        header = f.read(16)
+    if header.startswith(b"\xff\xd8\xff"):
+        return "JPEG"
+    if header.startswith(_PNG_SIGNATURE):
+        return "PNG"
+    if header[:6] in (b"GIF87a", b"GIF89a"):
+        return "GIF"
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "WEBP"
+    return None
+
+
+def _rewrite_ranges(path: str, ranges: list) -> None:
+    tmp_path = f"{path}.strip"
+    with open(path, "rb") as src, open(tmp_path, "wb") as dst:
+        for start, end in ranges:
+            src.seek(start)
+            remaining = end - start
+            while remaining > 0:
+                block = src.read(min(COPY_CHUNK_SIZE, remaining))
+                if not block:
+                    break
+                dst.write(block)
+                remaining -= len(block)
+    os.replace(tmp_path, path)
+
+
+def _scan_jpeg(path: str) -> tuple:
+    keep = []
+    stripped = 0
+    width = height = None
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if f.read(2) != b"\xff\xd8":
+            raise ValueError("нет маркера начала JPEG")
+        segment_start = 0
+        while True:
+            if f.read(1) != b"\xff":
+                raise ValueError("повреждена структура JPEG")
+            marker = f.read(1)
+            while marker == b"\xff":
+                marker = f.read(1)
+            if not marker:
+                raise ValueError("файл JPEG обрывается в заголовке")
+            code = marker[0]
+            if code == 0xD9:
+                raise ValueError("в JPEG нет данных изображения")
+            if code == 0x01 or 0xD0 <= code <= 0xD7:
+                continue
+            length_bytes = f.read(2)
+            if len(length_bytes) < 2:
+                raise ValueError("файл JPEG обрывается в заголовке")
+            length = struct.unpack(">H", length_bytes)[0]
+            position = f.tell()
+            if length < 2 or position + length - 2 > size:
+                raise ValueError("файл JPEG обрывается в заголовке")
+            prefix = f.read(min(length - 2, 40))
+            if code in _JPEG_SOF_MARKERS:
+                height, width = struct.unpack(">HH", prefix[1:5])
+            is_xmp = code == 0xE1 and prefix.startswith(JPEG_XMP_PREFIXES)
+            segment_end = position + length - 2
+            if code in JPEG_STRIP_MARKERS or is_xmp:
+                keep.append((segment_start, position - 4))
+                segment_start = segment_end
+                stripped += length + 2
+            f.seek(segment_end)
+            if code == 0xDA:
+                break
+        f.seek(max(segment_end, size - 4096))
+        if b"\xff\xd9" not in f.read():
+            raise ValueError("файл JPEG обрезан: нет маркера конца изображения")
+    if not width or not height:
+        raise ValueError("в JPEG не указаны размеры изображения")
+    keep.append((segment_start, size))
+    return width, height, stripped, keep
+
+
+def _scan_png(path: str) -> tuple:
+    keep = []
+    stripped = 0
+    width = height = None
+    with open(path, "rb") as f:
+        if f.read(8) != _PNG_SIGNATURE:
+            raise ValueError("нет сигнатуры PNG")
+        segment_start = 0
+        while True:
+            chunk_start = f.tell()
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError("файл PNG обрезан: нет блока IEND")
+            length, chunk_type = struct.unpack(">I4s", header)
+            data = f.read(length)
+            crc = f.read(4)
+            if len(data) < length or len(crc) < 4:
+                raise ValueError("файл PNG обрезан")
+            if zlib.crc32(chunk_type + data) != struct.unpack(">I", crc)[0]:
+                raise ValueError(f"неверная контрольная сумма блока PNG {chunk_type.decode('latin-1')}")
+            if chunk_type == b"IHDR":
+                width, height = struct.unpack(">II", data[:8])
+            if chunk_type in PNG_STRIP_CHUNKS:
+                keep.append((segment_start, chunk_start))
+                segment_start = f.tell()
+                stripped += length + 12
+            if chunk_type == b"IEND":
+                break
+        keep.append((segment_start, f.tell()))
+    if not width or not height:
+        raise ValueError("в PNG нет блока IHDR")
+    return width, height, stripped, keep
+
+
+def _decode(path: str, expected_format: str) -> None:
+    if Image is None:
+        return
+    with Image.open(path) as image:
+        if image.format != expected_format:
+            raise ValueError(f"Pillow распознал формат {image.format} вместо {expected_format}")
+        image.load()
+
+
+def _convert_to_png(path: str) -> None:
+    tmp_path = f"{path}.convert"
+    with Image.open(path) as image:
+        image.seek(0)
+        image = image.convert("RGBA" if "transparency" in image.info or image.mode in ("RGBA", "LA", "P") else "RGB")
+        image.save(tmp_path, "PNG", optimize=True)
+    os.replace(tmp_path, path)
+
+
+def validate_image(path: str, strip: bool = True) -> ImageInfo:
+    """Проверяет изображение и удаляет из него лишние метаданные.
+
+    Формат определяется по содержимому, а не по расширению. Проверяется
+    структура файла (для JPEG — маркеры и наличие конца изображения, для
+    PNG — контрольные суммы блоков и блок IEND), а если установлен
+    Pillow — что изображение полностью декодируется. GIF и WebP
+    с Pillow преобразуются в PNG. Метаданные удаляются без перекодирования:
+    XMP, блоки Photoshop и комментарии JPEG, текстовые блоки PNG. EXIF
+    (в том числе блок eXIf в PNG) сохраняется ради ориентации снимка.
+
+    Функция выполняется в отдельном процессе, поэтому ничего не пишет в лог.
+
+    Args:
+        path (str): Путь к файлу. Файл может быть изменён на месте.
+        strip (bool, optional): Удалять метаданные. По умолчанию True.
+
+    Returns:
+        ImageInfo: Формат, размеры изображения и объём удалённых метаданных.
+
+    Raises:
+        ValueError: Если файл не является изображением допустимого формата или повреждён.
+    """
+    try:
+        image_format = sniff_format(path)
+        if image_format in CONVERTIBLE_FORMATS and Image is not None:
+            original_size = os.path.getsize(path)
+            _convert_to_png(path)
+            width, height, _, _ = _scan_png(path)
+            return ImageInfo("PNG", ".png", width, height, original_size - os.path.getsize(path), rewritten=True)
+        if image_format not in FORMAT_EXTENSIONS:
+            raise ValueError(f"неподдерживаемый формат {image_format or 'файла'}")
+        scan = _scan_jpeg if image_format == "JPEG" else _scan_png
+        width, height, stripped, keep = scan(path)
+        _decode(path, image_format)
+        rewritten = bool(strip and stripped)
+        if rewritten:
+            _rewrite_ranges(path, keep)
+        return ImageInfo(image_format, FORMAT_EXTENSIONS[image_format], width, height, stripped if strip else 0,
+                         rewritten)
+    except (OSError, SyntaxError, struct.error) as e:
+        raise ValueError(f"изображение повреждено: {e}")
+    except Exception as e:
+        if Image is not None and isinstance(e, Image.DecompressionBombError):
+            raise ValueError(f"изображение слишком большое: {e}")
+        raise
+
+
+class ImageValidator:
+    """Пул процессов для проверки скачанных изображений.
+
+    Декодирование изображений нагружает процессор, поэтому выполняется
+    в отдельных процессах и не блокирует потоки загрузки других изображений
+    и цикл публикаций бота. Процессы запускаются при первой проверке.
+
+    Args:
+        workers (int, optional): Количество процессов.
+        strip (bool, optional): Удалять метаданные из изображений.
+    """
+
+    def __init__(self, workers: int = VALIDATION_WORKERS, strip: bool = True):
+        self.workers = max(1, workers)
+        self.strip = strip
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _get_executor(self) -> "ProcessPoolExecutor":
+        with self._lock:
+            if self._executor is None:
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context("forkserver" if "forkserver" in methods else None)
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+            return self._executor
+
+    def submit(self, path: str):
+        """Ставит изображение в очередь проверки.
+
+        Args:
+            path (str): Путь к файлу.
+
+        Returns:
+            concurrent.futures.Future: Future с ImageInfo.
+        """
+        return self._get_executor().submit(validate_image, path, self.strip)
+
+    def validate(self, path: str) -> ImageInfo:
+        """Проверяет изображение в пуле процессов и дожидается результата.
+
+        Args:
+            path (str): Путь к файлу.
+
+        Returns:
+            ImageInfo: Результат проверки.
+
+        Если пул процессов аварийно завершился, изображение проверяется
+        в текущем потоке, а пул пересоздаётся при следующей проверке.
+
+        Raises:
+            ValueError: Если изображение не прошло проверку.
+        """
+        try:
+            return self.submit(path).result()
+        except BrokenExecutor as e:
+            logger.warning(f"Пул проверки изображений остановился, проверка в текущем потоке: {e}")
+            with self._lock:
+                if self._executor is not None:
+                    self._executor.shutdown(wait=False)
+                    self._executor = None
+            return validate_image(path, self.strip)
+
+    def close(self) -> None:
+        """Останавливает процессы проверки."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+def validate_directories(image_dirs: list, strip: bool = True, workers: int = VALIDATION_WORKERS) -> tuple:
+    """Проверяет уже скачанные изображения в папках.
+
+    Изображения, которые не прошли проверку, удаляются (и при следующем
+    запуске скачиваются заново); изображения с неверным расширением
+    переименовываются. Манифесты папок обновляются.
+
+    Args:
+        image_dirs (list): Список папок с изображениями.
+        strip (bool, optional): Удалять метаданные.
+        workers (int, optional): Количество процессов проверки.
+
+    Returns:
+        tuple: Количество прошедших проверку и удалённых изображений.
+    """
+    paths = []
+    for image_dir in image_dirs:
+        if not os.path.isdir(image_dir):
+            continue
+        with os.scandir(image_dir) as entries:
+            paths.extend(
+                entry.path for entry in entries
+                if entry.is_file() and not entry.name.startswith(".")
+                and not entry.name.endswith((".part", ".tmp", ".json", ".jsonl"))
+            )
+    keys_by_filename = {}  # {папка: {имя файла: ключ манифеста}}
+    for image_dir in {os.path.dirname(path) for path in paths}:
+        keys_by_filename[image_dir] = {
+            entry["filename"]: entry["key"] for entry in get_manifest(image_dir).entries() if entry.get("filename")
+        }
+    valid = removed = 0
+    with ImageValidator(workers=workers, strip=strip) as validator:
+        futures = [(path, validator.submit(path)) for path in sorted(paths)]
+        for path, future in futures:
+            manifest = get_manifest(os.path.dirname(path))
+            dir_keys = keys_by_filename[os.path.dirname(path)]
+            key = dir_keys.get(os.path.basename(path))
+            try:
+                info = future.result()
+            except ValueError as e:
+                logger.warning(f"Удалено изображение, не прошедшее проверку, {path}: {e}")
+                os.remove(path)
+                if key:
+                    manifest.record(key, sha256=None)  # изображение будет скачано заново
+                removed += 1
+                continue
+            valid += 1
+            filename = os.path.basename(path)
+            if not path.lower().endswith(info.extension):
+                new_path = f"{os.path.splitext(path)[0]}{info.extension}"
+                if os.path.exists(new_path):
+                    logger.warning(f"Не удалось переименовать {path}: файл {new_path} уже существует")
+                else:
+                    os.replace(path, new_path)
+                    filename = os.path.basename(new_path)
+                    if key:
+                        dir_keys.pop(os.path.basename(path), None)
+                        dir_keys[filename] = key
+                    logger.info(f"Изображение {info.format} переименовано: {path} -> {new_path}")
+            if info.rewritten:
+                new_path = os.path.join(os.path.dirname(path), filename)
+                sha256 = file_sha256(new_path)
+                get_content_store().claim(new_path, sha256)
+                if key:
+                    manifest.record(key, sha256=sha256, size=os.path.getsize(new_path))
+            if key:
+                manifest.record(key, filename=filename, format=info.format, width=info.width, height=info.height)
+            if info.stripped_bytes:
+                logger.info(f"Из {path} удалено метаданных: {info.stripped_bytes} байт")
+    return valid, removed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Проверка уже скачанных изображений")
+    parser.add_argument(
+        "image_dirs",
+        nargs="*",
+        default=list(IMAGE_SOURCES.values()),
+        help="Папки с изображениями (по умолчанию все папки источников)"
+    )
+    parser.add_argument(
+        "--keep_metadata",
+        action="store_true",
+        help="Не удалять метаданные из изображений"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=VALIDATION_WORKERS,
+        help=f"Количество процессов проверки (по умолчанию {VALIDATION_WORKERS})"
+    )
+    args = parser.parse_args()
+
+    setup_logging()
+    valid_count, removed_count = validate_directories(args.image_dirs, strip=not args.keep_metadata,
+                                                      workers=args.workers)
+    logger.info(f"Проверено изображений: {valid_count}, удалено повреждённых: {removed_count}")
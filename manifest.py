@@ -0,0 +1,147 @@
+import json
+import os
+import re
+import threading
+from utils import logger
+
+
+MANIFEST_FILENAME = ".manifest.jsonl"  # Имя файла манифеста внутри папки с изображениями
+
+
+class DownloadManifest:
+    """Журнал скачанных изображений одной папки в формате JSON Lines.
+
+    Каждая строка — запись с ключом источника (URL, дата APOD, id снимка EPIC)
+    и сведениями о файле: имя, размер, SHA-256, ETag и Last-Modified.
+    При изменении записи в файл дописывается новая строка, при чтении
+    действует последняя строка для ключа.
+
+    Args:
+        save_dir (str): Папка с изображениями, в которой хранится манифест.
+    """
+
+    def __init__(self, save_dir: str):
+        self.save_dir = save_dir
+        self.path = os.path.join(save_dir, MANIFEST_FILENAME)
+        self._entries = {}
+        self._next_index = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        lines = 0
+        with open(self.path, encoding="utf-8") as f:
+            for line_number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                lines += 1
+                try:
+                    entry = json.loads(line)
+                    self._entries[entry["key"]] = entry
+                except (ValueError, KeyError, TypeError) as e:
+                    logger.warning(f"Пропущена повреждённая строка {line_number} манифеста {self.path}: {e}")
+        if lines > 2 * len(self._entries):
+            self.compact()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def entries(self) -> list:
+        """Возвращает копию всех записей манифеста.
+
+        Returns:
+            list: Список записей.
+        """
+        with self._lock:
+            return [dict(entry) for entry in self._entries.values()]
+
+    def get(self, key: str) -> dict | None:
+        """Возвращает запись по ключу.
+
+        Args:
+            key (str): Ключ источника.
+
+        Returns:
+            dict | None: Копия записи или None, если ключ неизвестен.
+        """
+        entry = self._entries.get(key)
+        return dict(entry) if entry else None
+
+    def record(self, key: str, **fields) -> dict:
+        """Добавляет или обновляет запись и сохраняет её на диск.
+
+        Args:
+            key (str): Ключ источника.
+            **fields: Поля записи. Поля со значением None удаляются.
+
+        Returns:
+            dict: Итоговая запись.
+        """
+        with self._lock:
+            entry = dict(self._entries.get(key, {}))
+            entry.update(fields)
+            entry = {name: value for name, value in entry.items() if value is not None}
+            entry["key"] = key
+            self._entries[key] = entry
+            os.makedirs(self.save_dir, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            return dict(entry)
+
+    def compact(self) -> None:
+        """Перезаписывает манифест, оставляя по одной строке на ключ."""
+        with self._lock:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for entry in self._entries.values():
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            os.replace(tmp_path, self.path)
+
+    def reserve_index(self, prefix: str) -> int:
+        """Выделяет следующий свободный индекс для имён файлов с префиксом.
+
+        Учитываются и файлы в папке, и записи манифеста, поэтому новые
+        изображения никогда не перезаписывают уже скачанные.
+
+        Args:
+            prefix (str): Префикс имени файла.
+
+        Returns:
+            int: Свободный индекс.
+        """
+        with self._lock:
+            if prefix not in self._next_index:
+                pattern = re.compile(rf"^{re.escape(prefix)}_(\d+)\.")
+                names = [entry.get("filename", "") for entry in self._entries.values()]
+                if os.path.isdir(self.save_dir):
+                    names.extend(os.listdir(self.save_dir))
+                indexes = [int(match.group(1)) for match in map(pattern.match, names) if match]
+                self._next_index[prefix] = max(indexes, default=-1) + 1
+            index = self._next_index[prefix]
+            self._next_index[prefix] += 1
+            return index
+
+
+_manifests = {}
+_manifests_lock = threading.Lock()
+
+
+def get_manifest(save_dir: str) -> DownloadManifest:
+    """Возвращает общий манифест папки, загружая его при первом обращении.
+
+    Args:
+        save_dir (str): Папка с изображениями.
+
+    Returns:
+        DownloadManifest: Манифест папки.
+    """
+    path = os.path.abspath(save_dir)
+    with _manifests_lock:
+        if path not in _manifests:
+            _manifests[path] = DownloadManifest(save_dir)
+        return _manifests[path]
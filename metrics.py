@@ -0,0 +1,385 @@
+import atexit
+import bisect
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+import image_catalog
+from settings import get_settings
+from utils import logger
+
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)  # Границы гистограмм длительности (секунды)
+SIZE_BUCKETS = tuple(
+    1024 * kb for kb in (16, 64, 256, 1024, 4096, 16384, 51200)
+)  # Границы гистограмм размера файлов (байт)
+METRICS_DUMP_INTERVAL = 60  # Как часто сохранять метрики в JSON-файл (секунды)
+
+_METRIC_TYPES = {
+    "http_request_seconds": ("histogram", "Время ответа на HTTP-запрос"),
+    "http_retries_total": ("counter", "Повторы HTTP-запросов после временных ошибок"),
+    "download_seconds": ("histogram", "Время загрузки одного изображения"),
+    "download_bytes": ("histogram", "Размер скачанного изображения"),
+    "fetch_seconds": ("histogram", "Время одного запуска скрипта загрузки"),
+    "telegram_send_seconds": ("histogram", "Время отправки изображения в Telegram"),
+    "catalog_scan_seconds": ("histogram", "Время сканирования папки каталогом"),
+    "catalog_images": ("gauge", "Количество изображений в каталоге"),
+    "directory_bytes": ("gauge", "Размер изображений в папке"),
+}  # Тип и описание известных метрик
+
+
+class MetricsRegistry:
+    """Хранилище счётчиков, гистограмм и текущих значений метрик.
+
+    Метрика определяется именем и набором меток, как в Prometheus.
+    Все методы потокобезопасны.
+    """
+
+    def __init__(self):
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> tuple:
+        return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        """Увеличивает счётчик.
+
+        Args:
+            name (str): Имя метрики.
+            value (float, optional): На сколько увеличить. По умолчанию 1.
+            **labels: Метки метрики.
+        """
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        """Устанавливает текущее значение метрики.
+
+        Args:
+            name (str): Имя метрики.
+            value (float): Значение.
+            **labels: Метки метрики.
+        """
+        with self._lock:
+            self._gauges[self._key(name, labels)] = value
+
+    def observe(self, name: str, value: float, buckets: tuple = LATENCY_BUCKETS, **labels) -> None:
+        """Добавляет наблюдение в гистограмму.
+
+        Args:
+            name (str): Имя метрики.
+            value (float): Наблюдаемое значение.
+            buckets (tuple, optional): Границы корзин, используются при первом наблюдении.
+            **labels: Метки метрики.
+        """
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {
+                    "buckets": tuple(buckets), "counts": [0] * (len(buckets) + 1), "sum": 0.0, "count": 0,
+                }
+            histogram["counts"][bisect.bisect_left(histogram["buckets"], value)] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    def snapshot(self) -> dict:
+        """Возвращает текущие значения всех метрик.
+
+        Returns:
+            dict: Словарь с ключами 'counters', 'gauges' и 'histograms';
+                в каждом — список {'name', 'labels', ...}.
+        """
+        with self._lock:
+            return {
+                "timestamp": time.time(),
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self._counters.items())
+                ],
+                "gauges": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self._gauges.items())
+                ],
+                "histograms": [
+                    {"name": name, "labels": dict(labels), "buckets": list(histogram["buckets"]),
+                     "counts": list(histogram["counts"]), "sum": histogram["sum"], "count": histogram["count"]}
+                    for (name, labels), histogram in sorted(self._histograms.items())
+                ],
+            }
+
+    def render_prometheus(self) -> str:
+        """Формирует текст метрик в формате Prometheus.
+
+        Returns:
+            str: Текст для ответа на запрос /metrics.
+        """
+        def format_labels(labels: dict, **extra) -> str:
+            items = {**labels, **extra}
+            if not items:
+                return ""
+            escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for value in items.values())
+            return "{" + ",".join(f'{label}="{value}"' for label, value in zip(items, escaped)) + "}"
+
+        snapshot = self.snapshot()
+        lines = []
+        described = set()
+
+        def describe(name: str, default_type: str) -> None:
+            if name in described:
+                return
+            described.add(name)
+            metric_type, description = _METRIC_TYPES.get(name, (default_type, name))
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {metric_type}")
+
+        for kind, default_type in (("counters", "counter"), ("gauges", "gauge")):
+            for metric in snapshot[kind]:
+                describe(metric["name"], default_type)
+                lines.append(f"{metric['name']}{format_labels(metric['labels'])} {metric['value']}")
+        for metric in snapshot["histograms"]:
+            name, labels = metric["name"], metric["labels"]
+            describe(name, "histogram")
+            cumulative = 0
+            for bound, count in zip(list(metric["buckets"]) + ["+Inf"], metric["counts"]):
+                cumulative += count
+                lines.append(f"{name}_bucket{format_labels(labels, le=bound)} {cumulative}")
+            lines.append(f"{name}_sum{format_labels(labels)} {metric['sum']}")
+            lines.append(f"{name}_count{format_labels(labels)} {metric['count']}")
+        return "\n".join(lines) + "\n"
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    """Проверяет, включён ли сбор метрик.
+
+    Returns:
+        bool: True, если метрики собираются.
+    """
+    return _registry is not None
+
+
+def get_registry() -> MetricsRegistry | None:
+    """Возвращает общее хранилище метрик.
+
+    Returns:
+        MetricsRegistry | None: Хранилище или None, если сбор метрик выключен.
+    """
+    return _registry
+
+
+def inc(name: str, value: float = 1, **labels) -> None:
+    """Увеличивает счётчик, если сбор метрик включён. См. MetricsRegistry.inc."""
+    if _registry is not None:
+        _registry.inc(name, value, **labels)
+
+
+def set_gauge(name: str, value: float, **labels) -> None:
+    """Устанавливает значение метрики, если сбор метрик включён. См. MetricsRegistry.set_gauge."""
+    if _registry is not None:
+        _registry.set_gauge(name, value, **labels)
+
+
+def observe(name: str, value: float, buckets: tuple = LATENCY_BUCKETS, **labels) -> None:
+    """Добавляет наблюдение в гистограмму, если сбор метрик включён. См. MetricsRegistry.observe."""
+    if _registry is not None:
+        _registry.observe(name, value, buckets, **labels)
+
+
+@contextmanager
+def _timer(name: str, labels: dict):
+    started = time.perf_counter()
+    result = "error"
+    try:
+        yield
+        result = "ok"
+    finally:
+        _registry.observe(name, time.perf_counter() - started, result=result, **labels)
+
+
+def timer(name: str, **labels):
+    """Контекстный менеджер, измеряющий длительность блока кода.
+
+    Длительность записывается в гистограмму name с дополнительной меткой
+    result: 'ok' или 'error', если блок завершился исключением. Поэтому
+    число успешных и неудачных операций видно по счётчикам гистограммы.
+    Если сбор метрик выключен, возвращается пустой контекстный менеджер.
+
+    Args:
+        name (str): Имя гистограммы.
+        **labels: Метки метрики.
+
+    Returns:
+        contextlib.AbstractContextManager: Контекстный менеджер.
+    """
+    if _registry is None:
+        return nullcontext()
+    return _timer(name, labels)
+
+
+def timed(name: str, **labels):
+    """Декоратор, измеряющий длительность вызовов функции, см. timer.
+
+    Если сбор метрик выключен, функция вызывается напрямую.
+
+    Args:
+        name (str): Имя гистограммы.
+        **labels: Метки метрики.
+
+    Returns:
+        Callable: Декоратор.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _registry is None:
+                return func(*args, **kwargs)
+            with _timer(name, labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def source_label(directory: str) -> str:
+    """Возвращает название источника для папки с изображениями.
+
+    Args:
+        directory (str): Папка.
+
+    Returns:
+        str: Источник из IMAGE_SOURCES или имя папки, если она не из их числа.
+    """
+    name = os.path.basename(os.path.normpath(directory))
+    for source, source_dir in image_catalog.IMAGE_SOURCES.items():
+        if source_dir == name:
+            return source
+    return name
+
+
+def _make_handler():
+    from http.server import BaseHTTPRequestHandler
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args) -> None:
+            pass
+
+        def do_GET(self) -> None:
+            if self.path in ("/", "/metrics"):
+                body = _registry.render_prometheus().encode("utf-8")
+                content_type = "text/plain; version=0.0.4; charset=utf-8"
+            elif self.path == "/metrics.json":
+                body = json.dumps(_registry.snapshot(), ensure_ascii=False).encode("utf-8")
+                content_type = "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1") -> "ThreadingHTTPServer":
+    """Запускает в фоновом потоке HTTP-сервер с метриками.
+
+    Метрики в формате Prometheus отдаются по адресу /metrics, в JSON — по /metrics.json.
+
+    Args:
+        port (int): Порт. 0 — выбрать свободный.
+        host (str, optional): Адрес. По умолчанию только локальный.
+
+    Returns:
+        ThreadingHTTPServer: Запущенный сервер.
+
+    Raises:
+        OSError: Если порт занят.
+    """
+    from http.server import ThreadingHTTPServer
+
+    server = ThreadingHTTPServer((host, port), _make_handler())
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info(f"Метрики доступны по адресу http://{host}:{server.server_port}/metrics")
+    return server
+
+
+def dump_metrics(path: str) -> None:
+    """Атомарно сохраняет текущие метрики в JSON-файл.
+
+    Args:
+        path (str): Путь к файлу.
+    """
+    if _registry is None:
+        return
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(_registry.snapshot(), f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.error(f"Не удалось сохранить метрики в {path}: {e}")
+
+
+def enable_metrics(port: int = None, dump_path: str = None, dump_interval: float = METRICS_DUMP_INTERVAL,
+                   host: str = "127.0.0.1") -> MetricsRegistry:
+    """Включает сбор метрик.
+
+    Args:
+        port (int, optional): Порт HTTP-сервера с метриками. None — не запускать сервер.
+        dump_path (str, optional): JSON-файл, в который метрики сохраняются каждые
+            dump_interval секунд и при завершении процесса. None — не сохранять.
+        dump_interval (float, optional): Интервал сохранения в секундах.
+        host (str, optional): Адрес HTTP-сервера.
+
+    Returns:
+        MetricsRegistry: Общее хранилище метрик.
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = MetricsRegistry()
+    if port is not None:
+        start_metrics_server(port, host)
+    if dump_path:
+        atexit.register(dump_metrics, dump_path)
+
+        def dump_periodically() -> None:
+            while True:
+                time.sleep(dump_interval)
+                dump_metrics(dump_path)
+
+        threading.Thread(target=dump_periodically, name="metrics-dump", daemon=True).start()
+    return _registry
+
+
+def configure_metrics() -> MetricsRegistry | None:
+    """Включает сбор метрик, если он настроен переменными окружения.
+
+    METRICS_PORT задаёт порт HTTP-сервера с метриками, METRICS_DUMP_PATH —
+    JSON-файл для сохранения метрик. Если ни одна переменная не задана,
+    метрики не собираются и инструментирование ничего не стоит.
+
+    Returns:
+        MetricsRegistry | None: Хранилище метрик или None, если сбор выключен.
+
+    Raises:
+        ValueError: Если METRICS_PORT не является числом.
+    """
+    settings = get_settings()
+    port = settings.get_int("METRICS_PORT")
+    dump_path = settings.get("METRICS_DUMP_PATH")
+    if port is None and not dump_path:
+        return None
+    return enable_metrics(port=port, dump_path=dump_path)
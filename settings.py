@@ -0,0 +1,120 @@
+import functools
+import os
+
+
+class Settings:
+    """Снимок настроек из переменных окружения и файла .env.
+
+    Значения читаются один раз при создании: переменные, заданные в
+    окружении процесса, имеют приоритет над файлом .env. Значения
+    по умолчанию и разбор настроек остаются у модулей, которые ими
+    пользуются.
+
+    Args:
+        environ (dict): Переменные окружения.
+    """
+
+    def __init__(self, environ: dict):
+        self._environ = dict(environ)
+
+    def get(self, name: str, default: str = None) -> str | None:
+        """Возвращает значение настройки.
+
+        Args:
+            name (str): Имя переменной окружения.
+            default (str, optional): Значение, если переменная не задана.
+
+        Returns:
+            str | None: Значение переменной.
+        """
+        return self._environ.get(name, default)
+
+    def get_float(self, name: str, default: float = None) -> float | None:
+        """Возвращает числовое значение настройки.
+
+        Args:
+            name (str): Имя переменной окружения.
+            default (float, optional): Значение, если переменная не задана или пуста.
+
+        Returns:
+            float | None: Значение переменной.
+
+        Raises:
+            ValueError: Если значение не является числом.
+        """
+        value = self._environ.get(name)
+        if not value:
+            return default
+        try:
+            return float(value)
+        except ValueError:
+            raise ValueError(f"{name} must be a number")
+
+    def get_int(self, name: str, default: int = None) -> int | None:
+        """Возвращает целое значение настройки.
+
+        Args:
+            name (str): Имя переменной окружения.
+            default (int, optional): Значение, если переменная не задана или пуста.
+
+        Returns:
+            int | None: Значение переменной.
+
+        Raises:
+            ValueError: Если значение не является целым числом.
+        """
+        value = self._environ.get(name)
+        if not value:
+            return default
+        try:
+            return int(value)
+        except ValueError:
+            raise ValueError(f"{name} must be an integer")
+
+
+def parse_source_values(value: str, name: str) -> dict:
+    """Разбирает числа по источникам из строки вида 'NASA APOD=3,NASA EPIC=1,SpaceX=1'.
+
+    Так задаются веса источников (TG_SOURCE_WEIGHTS) и бюджеты места
+    на диске (STORAGE_SOURCE_BUDGETS_MB).
+
+    Args:
+        value (str): Строка со значениями.
+        name (str): Название настройки для сообщений об ошибках.
+
+    Returns:
+        dict: Словарь {источник: значение}.
+
+    Raises:
+        ValueError: Если строка имеет неверный формат.
+    """
+    values = {}
+    for item in filter(None, (part.strip() for part in (value or "").split(","))):
+        source, separator, number = item.rpartition("=")
+        source = source.strip()
+        if not separator or not source:
+            raise ValueError(f"Неверный формат {name}: {item}")
+        try:
+            values[source] = float(number)
+        except ValueError:
+            raise ValueError(f"{name}: значение для источника {source} должно быть числом")
+        if values[source] < 0:
+            raise ValueError(f"{name}: значение для источника {source} не может быть отрицательным")
+    return values
+
+
+@functools.lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    """Загружает .env и возвращает общий снимок настроек.
+
+    Файл .env читается только при первом вызове. Чтобы перечитать
+    настройки (например, после изменения os.environ), вызовите
+    get_settings.cache_clear().
+
+    Returns:
+        Settings: Настройки процесса.
+    """
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    return Settings(os.environ)
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from utils import lazy_import, logger
+
+Image = lazy_import("PIL.Image")  # None, если Pillow не установлен
+
+
+DERIVATIVE_DIR = ".telegram_cache"  # Папка с уменьшенными копиями изображений для Telegram
+FILE_ID_CACHE_PATH = "telegram_file_ids.json"  # Файл с file_id уже загруженных в Telegram изображений
+MAX_SIDE = 2560  # Максимальная длина большей стороны изображения для Telegram (пиксели)
+JPEG_QUALITY = 87  # Качество JPEG для уменьшенных копий
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024  # Ограничение Telegram на размер фотографии (байт)
+
+
+class TelegramUploadCache:
+    """Кэш подготовленных для Telegram изображений и их file_id.
+
+    Для каждого изображения один раз создаётся уменьшенная копия в JPEG
+    (большая сторона не длиннее max_side), которая хранится на диске.
+    После первой успешной отправки запоминается file_id, который вернул
+    Telegram: повторные публикации того же изображения отправляют только
+    file_id и не загружают файл заново.
+
+    Args:
+        cache_dir (str, optional): Папка для уменьшенных копий.
+        file_ids_path (str, optional): JSON-файл с сохранёнными file_id.
+        max_side (int, optional): Максимальная длина большей стороны в пикселях.
+        quality (int, optional): Качество JPEG.
+    """
+
+    def __init__(self, cache_dir: str = DERIVATIVE_DIR, file_ids_path: str = FILE_ID_CACHE_PATH,
+                 max_side: int = MAX_SIDE, quality: int = JPEG_QUALITY):
+        if Image is None:
+            logger.warning("Pillow не установлен, изображения будут отправляться без уменьшения")
+        self.cache_dir = cache_dir
+        self.file_ids_path = file_ids_path
+        self.max_side = max_side
+        self.quality = quality
+        self._file_ids = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.file_ids_path):
+            return
+        try:
+            with open(self.file_ids_path, encoding="utf-8") as f:
+                self._file_ids = dict(json.load(f))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Не удалось прочитать кэш file_id {self.file_ids_path}: {e}")
+
+    def _save_locked(self) -> None:
+        tmp_path = f"{self.file_ids_path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._file_ids, f)
+            os.replace(tmp_path, self.file_ids_path)
+        except OSError as e:
+            logger.error(f"Не удалось сохранить кэш file_id {self.file_ids_path}: {e}")
+
+    @staticmethod
+    def key(image_path: str) -> str:
+        """Возвращает ключ изображения: путь, размер и время изменения файла.
+
+        Args:
+            image_path (str): Путь к изображению.
+
+        Returns:
+            str: Ключ кэша.
+
+        Raises:
+            OSError: Если файл недоступен.
+        """
+        stat = os.stat(image_path)
+        identity = f"{os.path.abspath(image_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+        return hashlib.sha1(identity.encode("utf-8")).hexdigest()
+
+    def get_file_id(self, key: str) -> str | None:
+        """Возвращает сохранённый file_id изображения.
+
+        Args:
+            key (str): Ключ изображения.
+
+        Returns:
+            str | None: file_id или None, если изображение ещё не загружалось.
+        """
+        with self._lock:
+            return self._file_ids.get(key)
+
+    def remember(self, key: str, file_id: str) -> None:
+        """Сохраняет file_id изображения.
+
+        Args:
+            key (str): Ключ изображения.
+            file_id (str): file_id, который вернул Telegram.
+        """
+        with self._lock:
+            self._file_ids[key] = file_id
+            self._save_locked()
+
+    def forget(self, key: str) -> None:
+        """Удаляет недействительный file_id изображения.
+
+        Args:
+            key (str): Ключ изображения.
+        """
+        with self._lock:
+            if self._file_ids.pop(key, None) is not None:
+                self._save_locked()
+
+    def prepare(self, image_path: str, key: str = None) -> str:
+        """Возвращает путь к копии изображения, подготовленной для Telegram.
+
+        Изображения, которые уже являются JPEG подходящего размера,
+        отправляются как есть. Если Pillow не установлен или изображение
+        не удалось обработать, возвращается исходный путь.
+
+        Args:
+            image_path (str): Путь к изображению.
+            key (str, optional): Ключ изображения, если уже посчитан.
+
+        Returns:
+            str: Путь к файлу для загрузки.
+        """
+        if Image is None:
+            return image_path
+        derivative_path = os.path.join(self.cache_dir, f"{key or self.key(image_path)}.jpg")
+        if os.path.exists(derivative_path):
+            return derivative_path
+        try:
+            with Image.open(image_path) as image:
+                fits = max(image.size) <= self.max_side and os.path.getsize(image_path) <= MAX_UPLOAD_BYTES
+                if image.format == "JPEG" and fits:
+                    return image_path
+                if image.mode not in ("RGB", "L"):
+                    image = image.convert("RGBA")
+                    background = Image.new("RGB", image.size)
+                    background.paste(image, mask=image.getchannel("A"))
+                    image = background
+                image.thumbnail((self.max_side, self.max_side))
+                os.makedirs(self.cache_dir, exist_ok=True)
+                # Уникальный временный файл: одно изображение могут готовить сразу несколько каналов
+                fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=self.cache_dir)
+                os.close(fd)
+                try:
+                    quality = self.quality
+                    while True:
+                        image.save(tmp_path, "JPEG", quality=quality, optimize=True, progressive=True)
+                        if os.path.getsize(tmp_path) <= MAX_UPLOAD_BYTES or quality <= 50:
+                            break
+                        quality -= 10
+                    os.replace(tmp_path, derivative_path)
+                except BaseException:
+                    os.remove(tmp_path)
+                    raise
+        except (OSError, ValueError) as e:
+            logger.warning(f"Не удалось подготовить {image_path} для Telegram: {e}")
+            return image_path
+        logger.info(
+            f"Подготовлена копия для Telegram: {derivative_path} "
+            f"({os.path.getsize(image_path)} -> {os.path.getsize(derivative_path)} байт)"
+        )
+        return derivative_path
@@ -1,11 +1,56 @@
+import importlib
+import importlib.util
 import logging
+import sys
+import types
 
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s"
-)
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"  # Формат сообщений журнала
+
 logger = logging.getLogger(__name__)
 
 
+def setup_logging(level: int = logging.INFO) -> None:
+    """Настраивает вывод журнала в консоль.
+
+    Вызывается точками входа (скриптами и ботом), а не при импорте модуля,
+    чтобы импорт модулей проекта не менял настройки логирования процесса.
+
+    Args:
+        level (int, optional): Минимальный уровень сообщений. По умолчанию INFO.
+    """
+    logging.basicConfig(level=level, format=LOG_FORMAT)
+
+
+class _LazyModule(types.ModuleType):
+    """Заместитель модуля, который импортирует настоящий модуль при обращении к атрибуту."""
+
+    def __getattr__(self, name: str):
+        # import_module потокобезопасен: пока модуль загружается в одном потоке,
+        # остальные потоки ждут его полной инициализации
+        return getattr(importlib.import_module(self.__name__), name)
+
+
+def lazy_import(name: str):
+    """Возвращает модуль, который загружается при первом обращении к его атрибутам.
+
+    Тяжёлые зависимости (requests, telegram, Pillow) импортируются так на
+    уровне модуля: код пользуется ими как обычно, но время импорта
+    тратится только тогда, когда модуль действительно нужен. Обращаться
+    к модулю можно из любых потоков.
+
+    Args:
+        name (str): Полное имя модуля, например 'requests' или 'PIL.Image'.
+
+    Returns:
+        module | None: Модуль или None, если он не установлен.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    try:
+        spec = importlib.util.find_spec(name)
+    except ImportError:
+        return None
+    if spec is None:
+        return None
+    return _LazyModule(name)